@@ -0,0 +1,63 @@
+#----------------------------------------------------------------------------------------------------
+"""Compare the URL page's HTML-to-text step: BeautifulSoup.get_text() vs llm_wrapper.html_text.
+
+For every saved page in benchmarks/fixtures/html, reports the extracted
+characters, the chunks produced with the page's default chunking (each chunk is
+one embedding to compute and store) and the median extraction time.
+
+    python benchmarks/html_extraction.py [--runs 20] [--chunk-size 1000] [--chunk-overlap 200]
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from llm_wrapper.html_text import extract_text
+from llm_wrapper.ingest import iter_chunks
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+
+#-------------------------------------------------------------------
+def soup_text(html):
+    return BeautifulSoup(html, "html.parser").get_text()
+
+def measure(function, html, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = function(html)
+        timings.append(time.perf_counter() - start)
+    return text, statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    args = parser.parse_args()
+
+    row = "{:<34} {:>9} {:>9} {:>10} {:>10} {:>7} {:>7}"
+    print(row.format("page", "chars bs4", "chars new", "chunks bs4", "chunks new", "ms bs4", "ms new"))
+    totals = [0, 0, 0, 0, 0.0, 0.0]
+    for path in sorted(glob.glob(os.path.join(fixtures, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        results = []
+        for function in (soup_text, extract_text):
+            text, milliseconds = measure(function, html, args.runs)
+            chunks = sum(1 for _ in iter_chunks([text], args.chunk_size, args.chunk_overlap))
+            results.append((len(text), chunks, milliseconds))
+        (chars_old, chunks_old, ms_old), (chars_new, chunks_new, ms_new) = results
+        for i, value in enumerate((chars_old, chars_new, chunks_old, chunks_new, ms_old, ms_new)):
+            totals[i] += value
+        print(row.format(os.path.basename(path), chars_old, chars_new, chunks_old, chunks_new, "%.1f" % ms_old, "%.1f" % ms_new))
+    print(row.format("total", totals[0], totals[1], totals[2], totals[3], "%.1f" % totals[4], "%.1f" % totals[5]))
+
+if __name__ == "__main__":
+    main()
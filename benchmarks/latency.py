@@ -0,0 +1,295 @@
+#----------------------------------------------------------------------------------------------------
+"""Latency benchmark of the ingest and query paths, headless and offline.
+
+Runs the steps of the loader pages without Streamlit: the sample PDF, text file
+and HTML pages of benchmarks/fixtures are parsed, chunked, embedded in batches
+and indexed in an in-memory knowledge base, then a set of questions is searched
+and answered through webuiLLM. Answers come from the local text-generation-webui
+stub (benchmarks/stub_webui.py) unless WEBUI_API_URL points to a real server.
+
+The embedding and response caches are disabled, so every run computes every
+stage. Without the embeddings model in the local Hugging Face cache, a hashing
+embedder of the same dimension stands in for it (--embeddings hashing) and the
+embed timings only measure the pipeline around the model.
+
+For every stage it reports the operations timed, their p50/p95/p99 latency and
+the throughput in items per second, and writes them as JSON for comparison
+between commits.
+
+    python benchmarks/latency.py [--runs 3] [--embeddings auto|model|hashing] [--index qdrant|numpy] [--output results.json]
+"""
+import argparse
+import datetime
+import glob
+import hashlib
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Every stage is measured uncached and without network access
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+os.environ["RESPONSE_CACHE_PATH"] = ""
+os.environ["TRACE_PATH"] = ""
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import numpy as np
+from langchain.chains.question_answering import load_qa_chain
+from langchain_core.embeddings import Embeddings
+
+import stub_webui
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+questions = [
+    "How do I open a new window in IDLE?",
+    "What does the Option enum look like?",
+    "When is unsafe code needed in Rust?",
+    "Which keys move the cursor in the editor?",
+    "How does match work with enum variants?",
+    "What are raw pointers and how are they dereferenced?",
+    "Which exploit mitigations does rustc enable by default?",
+    "What is stack clashing protection?",
+    "How much money was approved for the cycling network?",
+    "When will the construction of the river route start?",
+    "How do I run a module from the editor?",
+    "What is the difference between an enum and a struct?",
+]
+
+#-------------------------------------------------------------------
+class HashingEmbeddings(Embeddings):
+    """Offline stand-in for the sentence-transformer: hashed bag of words, normalised."""
+
+    def __init__(self, size=384):
+        self.size = size
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.size] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+def select_embeddings(choice):
+    """Load the real model, or install the hashing embedder; returns the name used."""
+    from llm_wrapper import embeddings
+    if choice in ("auto", "model"):
+        try:
+            embeddings._load_model()
+            return embeddings.model_name
+        except Exception as e:
+            if choice == "model":
+                raise
+            print("embeddings model unavailable offline (" + type(e).__name__ + "), using the hashing embedder")
+    embeddings.use_model(HashingEmbeddings())
+    return "hashing"
+
+#-------------------------------------------------------------------
+def percentile(values, q):
+    """Linearly interpolated percentile of a non empty list."""
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+class Stage:
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.timings = []
+        self.items = 0
+
+    def add(self, seconds, items=1):
+        self.timings.append(seconds)
+        self.items += items
+
+    def summary(self):
+        total = sum(self.timings)
+        return {
+            "unit": self.unit,
+            "operations": len(self.timings),
+            "items": self.items,
+            "total_s": total,
+            "p50_ms": percentile(self.timings, 50) * 1000,
+            "p95_ms": percentile(self.timings, 95) * 1000,
+            "p99_ms": percentile(self.timings, 99) * 1000,
+            "throughput": self.items / total if total else 0.0,
+        }
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+#-------------------------------------------------------------------
+def load_sources():
+    """(name, kind, content) of the bundled sample documents."""
+    sources = []
+    with open(os.path.join(fixtures, "sample.pdf"), "rb") as f:
+        sources.append(("sample.pdf", "pdf", f.read()))
+    with open(os.path.join(fixtures, "sample.txt"), "rb") as f:
+        sources.append(("sample.txt", "text", f.read()))
+    for path in sorted(glob.glob(os.path.join(fixtures, "html", "*.html"))):
+        with open(path, "rb") as f:
+            sources.append((os.path.basename(path), "html", f.read()))
+    return sources
+
+def run(stages, sources, args):
+    """One pass over every stage."""
+    # Imported here: the backend reads WEBUI_API_URL, set to the stub by main(), on import
+    from llm_wrapper.budget import pack_documents
+    from llm_wrapper.embeddings import get_embeddings
+    from llm_wrapper.html_text import extract_text
+    from llm_wrapper.ingest import batch_size, iter_batches, iter_chunks
+    from llm_wrapper.pdf import extract_pages
+    from llm_wrapper.retrieval import retrieve
+    from llm_wrapper.vectorstore import add_chunks, new_knowledge_base
+    from llm_wrapper.webui import webuiLLM
+
+    # Parse: one operation per document
+    texts = []
+    for name, kind, content in sources:
+        if kind == "pdf":
+            pages, seconds = timed(lambda: list(extract_pages([content])))
+        elif kind == "html":
+            pages, seconds = timed(lambda: [extract_text(content)])
+        else:
+            pages, seconds = timed(lambda: [content.decode("utf-8")])
+        stages["parse"].add(seconds)
+        texts.append(pages)
+
+    # Chunk: one operation per document
+    chunks = []
+    for pages in texts:
+        document_chunks, seconds = timed(lambda: list(iter_chunks(pages, args.chunk_size, args.chunk_overlap)))
+        stages["chunk"].add(seconds, len(document_chunks))
+        chunks.extend(document_chunks)
+
+    # Embed and index: one operation per ingest batch
+    embeddings = get_embeddings()
+    knowledge_base = None
+    for batch in iter_batches(chunks, batch_size):
+        vectors, seconds = timed(embeddings.embed_documents, batch)
+        stages["embed"].add(seconds, len(batch))
+        if knowledge_base is None:
+            knowledge_base, seconds = timed(new_knowledge_base, len(vectors[0]), backend=args.index)
+            stages["index"].add(seconds, 0)
+        _, seconds = timed(add_chunks, knowledge_base, batch, vectors)
+        stages["index"].add(seconds, len(batch))
+
+    # Retrieve and generate: one operation per question
+    chain = load_qa_chain(webuiLLM(max_tokens=args.max_tokens), chain_type="stuff")
+    for question in questions:
+        retrieval, seconds = timed(retrieve, knowledge_base, question, args.k)
+        stages["retrieve"].add(seconds)
+
+        # Same steps as prompting_llm with streaming: fit the chunks, format, stream
+        start = time.perf_counter()
+        budget = pack_documents(chain, retrieval.documents, question)
+        inputs = chain._get_inputs(budget.documents, question=question)
+        first_token = None
+        tokens = 0
+        for token in chain.llm_chain.llm.stream(chain.llm_chain.prompt.format(**inputs)):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            tokens += 1
+        stages["generate"].add(time.perf_counter() - start, tokens)
+        stages["first_token"].add(first_token if first_token is not None else time.perf_counter() - start)
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=root, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3, help="passes over the whole pipeline, after one warm-up pass")
+    parser.add_argument("--embeddings", choices=["auto", "model", "hashing"], default="auto")
+    parser.add_argument("--index", choices=["qdrant", "numpy"], default="qdrant", help="in-memory index of the chunks")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("-k", type=int, default=6, help="chunks retrieved per question")
+    parser.add_argument("--max-tokens", type=int, default=256, help="max_tokens of the LLM, reserved in the prompt budget")
+    parser.add_argument("--stub-tokens", type=int, default=64, help="tokens per answer of the stub")
+    parser.add_argument("--stub-token-delay", type=float, default=0.0, help="seconds before each token of the stub")
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/latency-<time>.json)")
+    args = parser.parse_args()
+
+    server = None
+    if "WEBUI_API_URL" not in os.environ:
+        server = stub_webui.start(tokens=args.stub_tokens, token_delay=args.stub_token_delay)
+        os.environ["WEBUI_API_URL"] = server.url
+    embeddings_used = select_embeddings(args.embeddings)
+
+    sources = load_sources()
+    # The warm-up pass loads the lazy parts (tokenizer, thread pools, HTTP connections) outside the timings
+    run({name: Stage(name, "") for name in ("parse", "chunk", "embed", "index", "retrieve", "generate", "first_token")}, sources, args)
+    stages = {
+        "parse": Stage("parse", "documents"),
+        "chunk": Stage("chunk", "chunks"),
+        "embed": Stage("embed", "chunks"),
+        "index": Stage("index", "chunks"),
+        "retrieve": Stage("retrieve", "queries"),
+        "generate": Stage("generate", "tokens"),
+        "first_token": Stage("first_token", "answers"),
+    }
+    for _ in range(args.runs):
+        run(stages, sources, args)
+    if server is not None:
+        server.shutdown()
+
+    row = "{:<12} {:>5} {:>7} {:>10} {:>10} {:>10} {:>12}"
+    print(row.format("stage", "ops", "items", "p50 ms", "p95 ms", "p99 ms", "items/s"))
+    results = {}
+    for name, stage in stages.items():
+        summary = results[name] = stage.summary()
+        print(row.format(name, summary["operations"], summary["items"], "%.2f" % summary["p50_ms"],
+                         "%.2f" % summary["p95_ms"], "%.2f" % summary["p99_ms"], "%.1f %s" % (summary["throughput"], stage.unit)))
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         "latency-" + now.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "time": now.isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {
+                "runs": args.runs,
+                "embeddings": embeddings_used,
+                "index": args.index,
+                "webui": "stub" if server is not None else os.environ["WEBUI_API_URL"],
+                "chunk_size": args.chunk_size,
+                "chunk_overlap": args.chunk_overlap,
+                "k": args.k,
+                "max_tokens": args.max_tokens,
+                "stub_tokens": args.stub_tokens,
+                "stub_token_delay": args.stub_token_delay,
+                "documents": [name for name, _, _ in sources],
+                "questions": len(questions),
+            },
+            "stages": results,
+        }, f, indent=2)
+    print("results written to " + output)
+
+if __name__ == "__main__":
+    main()
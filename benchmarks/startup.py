@@ -0,0 +1,159 @@
+#----------------------------------------------------------------------------------------------------
+"""Cold start and first paint of `streamlit run HomePage.py`, measured headless.
+
+Starts the app in a new server process (with the text-generation-webui stub of
+benchmarks/stub_webui.py as backend unless WEBUI_API_URL is set), then opens a
+browser session over Streamlit's websocket and asks for a page run, the way the
+browser does. Reports, for each run on a fresh server:
+
+    ready        server start until its health check answers
+    first paint  page run request until the first element is received
+    page run     page run request until the script has finished
+
+then a second session on the same server, once the background imports are
+done. Results are printed, written as JSON, and compared to the targets: the
+exit code is 1 when a median exceeds its target.
+
+    python benchmarks/startup.py [--runs 3] [--page HomePage.py] [--target-paint 1.0] [--target-ready 5.0]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.websocket import websocket_connect
+
+import stub_webui
+
+#-------------------------------------------------------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_ready(port, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("streamlit exited with code {}".format(process.returncode))
+        try:
+            with urllib.request.urlopen("http://127.0.0.1:{}/_stcore/health".format(port), timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError("streamlit not ready after {} s".format(timeout))
+
+async def page_run(port, timeout):
+    """(first paint, page run) in seconds for one browser session."""
+    connection = await websocket_connect("ws://127.0.0.1:{}/_stcore/stream".format(port))
+    try:
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        start = time.perf_counter()
+        await connection.write_message(message.SerializeToString(), binary=True)
+        first_paint = None
+        while True:
+            data = await asyncio.wait_for(connection.read_message(), timeout)
+            if data is None:
+                raise RuntimeError("websocket closed by the server")
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and first_paint is None:
+                first_paint = time.perf_counter() - start
+            if kind == "script_finished":
+                return first_paint, time.perf_counter() - start
+    finally:
+        connection.close()
+
+def measure(args, env):
+    """One fresh server: (ready, first paint, page run, warm first paint, warm page run) in seconds."""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", args.page, "--server.headless", "true",
+         "--server.port", str(port), "--server.address", "127.0.0.1", "--browser.gatherUsageStats", "false"],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port, process, args.timeout)
+        ready = time.perf_counter() - start
+        first_paint, run = asyncio.run(page_run(port, args.timeout))
+        # A second visitor, once the background imports had the time to finish
+        time.sleep(args.warm_delay)
+        warm_paint, warm_run = asyncio.run(page_run(port, args.timeout))
+        return ready, first_paint, run, warm_paint, warm_run
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3, help="fresh servers started")
+    parser.add_argument("--page", default="HomePage.py")
+    parser.add_argument("--target-ready", type=float, default=5.0, help="seconds, median server start")
+    parser.add_argument("--target-paint", type=float, default=1.0, help="seconds, median first paint of a fresh server")
+    parser.add_argument("--warm-delay", type=float, default=5.0, help="seconds before the second session")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/startup-<time>.json)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # No network: the embeddings model is only loaded when already in the Hugging Face cache
+    env.setdefault("HF_HUB_OFFLINE", "1")
+    env.setdefault("TRANSFORMERS_OFFLINE", "1")
+    server = None
+    if "WEBUI_API_URL" not in env:
+        server = stub_webui.start()
+        env["WEBUI_API_URL"] = server.url
+    os.makedirs(os.path.join(root, "logs"), exist_ok=True)
+
+    names = ["ready", "first_paint", "page_run", "warm_first_paint", "warm_page_run"]
+    samples = {name: [] for name in names}
+    for _ in range(args.runs):
+        for name, value in zip(names, measure(args, env)):
+            samples[name].append(value)
+    if server is not None:
+        server.shutdown()
+
+    results = {name: {"median_s": statistics.median(values), "max_s": max(values), "samples_s": values}
+               for name, values in samples.items()}
+    targets = {"ready": args.target_ready, "first_paint": args.target_paint}
+    failed = False
+    for name in names:
+        line = "{:<17} median {:6.3f} s   max {:6.3f} s".format(name, results[name]["median_s"], results[name]["max_s"])
+        if name in targets:
+            passed = results[name]["median_s"] <= targets[name]
+            failed = failed or not passed
+            results[name]["target_s"] = targets[name]
+            line += "   target {:.1f} s {}".format(targets[name], "ok" if passed else "MISSED")
+        print(line)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         "startup-" + now.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"time": now.isoformat(), "page": args.page, "runs": args.runs, "results": results}, f, indent=2)
+    print("results written to " + output)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#----------------------------------------------------------------------------------------------------
+"""Local stand-in for the text-generation-webui API, for benchmarks and offline runs.
+
+Answers the endpoints llm_wrapper uses: /v1/completions (plain and streamed as
+server-sent events), /v1/internal/model/info, /v1/internal/model/list and
+/v1/internal/stop-generation. Every completion is the same canned answer, sent
+one token at a time after an optional per-token delay, so the timings measure
+the wrapper rather than a model.
+
+    python benchmarks/stub_webui.py [--port 5000] [--token-delay 0.0] [--tokens 64]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#-------------------------------------------------------------------
+model_name = "stub-model"
+context_length = 4096
+words = ("The answer is based on the context provided in the documents , which describes "
+         "the requested topic in detail and gives a few examples of its use .").split()
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    tokens = 64
+    token_delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _completion(self, max_tokens):
+        for i in range(min(self.tokens, max_tokens)):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield " " + words[i % len(words)]
+
+    def do_GET(self):
+        if self.path == "/v1/internal/model/info":
+            self._send_json({"model_name": model_name, "lora_names": [], "truncation_length": context_length})
+        elif self.path == "/v1/internal/model/list":
+            self._send_json({"model_names": [model_name]})
+        else:
+            self._send_json({"detail": "Not Found"}, 404)
+
+    def do_POST(self):
+        body = self._read_json()
+        if self.path == "/v1/internal/stop-generation":
+            self._send_json("OK")
+        elif self.path == "/v1/completions" and body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for token in self._completion(body.get("max_tokens", 1024)):
+                self.wfile.write(("data: " + json.dumps({"choices": [{"text": token}]}) + "\n\n").encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+        elif self.path == "/v1/completions":
+            self._send_json({"choices": [{"text": "".join(self._completion(body.get("max_tokens", 1024)))}]})
+        else:
+            self._send_json({"detail": "Not Found"}, 404)
+
+#-------------------------------------------------------------------
+def start(port=0, tokens=64, token_delay=0.0):
+    """Serve the stub from a daemon thread; returns the server (its URL is server.url)."""
+    handler = type("Handler", (StubHandler,), {"tokens": tokens, "token_delay": token_delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.url = "http://127.0.0.1:" + str(server.server_address[1])
+    threading.Thread(target=server.serve_forever, name="stub-webui", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--tokens", type=int, default=64, help="tokens per completion")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds before each token")
+    args = parser.parse_args()
+    server = start(args.port, args.tokens, args.token_delay)
+    print("text-generation-webui stub on " + server.url)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#----------------------------------------------------------------------------------------------------
+"""Benchmark of the in-memory indexes: Qdrant against the NumPy matrix.
+
+Builds each index the way the ingest does (new_knowledge_base, then add_chunks
+by batches of INGEST_BATCH_SIZE) from synthetic normalised vectors, then
+searches it with queries close to random chunks. No embeddings model or
+network is needed: the vectors are generated, so only the indexes are timed.
+
+For every number of chunks and every index it reports:
+
+    build        new_knowledge_base and every add_chunks, in ms
+    query        one similarity_search_with_score_by_vector, p50/p95 in ms
+    batch        similarity_search_batch_with_score_by_vectors of all the queries, ms per query
+    memory       Python allocations held by the index after the build (tracemalloc), in MiB
+    agreement    share of Qdrant's top k also returned by the index
+
+    python benchmarks/vector_index.py [--chunks 100 300 1000 5000] [--queries 50] [-k 6] [--output results.json]
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+import numpy as np
+
+from llm_wrapper.ingest import batch_size, iter_batches
+from llm_wrapper.vectorstore import add_chunks, new_knowledge_base
+
+indexes = {
+    "qdrant": lambda size: new_knowledge_base(size),
+    "numpy": lambda size: new_knowledge_base(size, backend="numpy"),
+}
+
+#-------------------------------------------------------------------
+def dataset(chunks, queries, size, seed=0):
+    """Chunk texts, their normalised vectors, and query vectors near random chunks."""
+    generator = np.random.default_rng(seed)
+    vectors = generator.standard_normal((chunks, size)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    targets = generator.integers(0, chunks, queries)
+    query_vectors = vectors[targets] + 0.5 * generator.standard_normal((queries, size)).astype(np.float32) / np.sqrt(size)
+    texts = ["chunk " + str(i) for i in range(chunks)]
+    return texts, vectors.tolist(), query_vectors.tolist()
+
+def build(make_index, texts, vectors):
+    knowledge_base = make_index(len(vectors[0]))
+    for batch in iter_batches(range(len(texts)), batch_size):
+        add_chunks(knowledge_base, [texts[i] for i in batch], [vectors[i] for i in batch])
+    return knowledge_base
+
+def measure(make_index, texts, vectors, query_vectors, k, runs):
+    """Timings and memory of one index, and the texts of its top k per query."""
+    start = time.perf_counter()
+    knowledge_base = build(make_index, texts, vectors)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    query_ms = []
+    for _ in range(runs):
+        for vector in query_vectors:
+            start = time.perf_counter()
+            knowledge_base.similarity_search_with_score_by_vector(vector, k=k)
+            query_ms.append((time.perf_counter() - start) * 1000)
+    batch_ms = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        results = knowledge_base.similarity_search_batch_with_score_by_vectors(query_vectors, k=k)
+        batch_ms.append((time.perf_counter() - start) * 1000 / len(query_vectors))
+    top = [{doc.page_content for doc, score in docs_stats} for docs_stats in results]
+    del knowledge_base
+
+    # Memory is measured on another build: tracing the allocations slows it down
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    knowledge_base = build(make_index, texts, vectors)
+    gc.collect()
+    memory = (tracemalloc.get_traced_memory()[0] - before) / 2**20
+    tracemalloc.stop()
+    del knowledge_base
+
+    return {
+        "build_ms": build_ms,
+        "query_p50_ms": float(np.percentile(query_ms, 50)),
+        "query_p95_ms": float(np.percentile(query_ms, 95)),
+        "batch_ms_per_query": float(np.median(batch_ms)),
+        "memory_mib": memory,
+    }, top
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=root, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#-------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, nargs="+", default=[100, 300, 1000, 5000], help="sizes of the knowledge base")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--size", type=int, default=384, help="dimension of the vectors (384 for the MiniLM model)")
+    parser.add_argument("-k", type=int, default=6, help="chunks retrieved per question")
+    parser.add_argument("--runs", type=int, default=3, help="passes over the queries")
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/vector_index-<time>.json)")
+    args = parser.parse_args()
+
+    # Warm-up: imports, Qdrant's first collection, NumPy's BLAS threads
+    texts, vectors, query_vectors = dataset(100, 5, args.size)
+    for make_index in indexes.values():
+        measure(make_index, texts, vectors, query_vectors, args.k, 1)
+
+    row = "{:<8} {:<14} {:>10} {:>10} {:>10} {:>12} {:>10} {:>10}"
+    print(row.format("chunks", "index", "build ms", "query p50", "query p95", "batch/query", "MiB", "agreement"))
+    results = []
+    for chunks in args.chunks:
+        texts, vectors, query_vectors = dataset(chunks, args.queries, args.size)
+        reference = None
+        for name, make_index in indexes.items():
+            summary, top = measure(make_index, texts, vectors, query_vectors, args.k, args.runs)
+            if reference is None:
+                reference = top
+            summary["agreement"] = float(np.mean([len(a & b) / len(a) for a, b in zip(reference, top)]))
+            results.append({"chunks": chunks, "index": name, **summary})
+            print(row.format(chunks, name, "%.1f" % summary["build_ms"], "%.3f" % summary["query_p50_ms"],
+                             "%.3f" % summary["query_p95_ms"], "%.3f" % summary["batch_ms_per_query"],
+                             "%.2f" % summary["memory_mib"], "%.3f" % summary["agreement"]))
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         "vector_index-" + now.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "time": now.isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {"queries": args.queries, "size": args.size, "k": args.k, "runs": args.runs, "batch_size": batch_size},
+            "results": results,
+        }, f, indent=2)
+    print("results written to " + output)
+
+if __name__ == "__main__":
+    main()
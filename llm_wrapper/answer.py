@@ -0,0 +1,81 @@
+#----------------------------------------------------------------------------------------------------
+"""Answering a question over retrieved chunks, without Streamlit.
+
+The steps the loader pages and the API share: fit the chunks into the
+context, look the answer up in the response cache, then prompt the stuff
+question answering chain, streamed or not. The caller stores the answer with
+llm_wrapper.response_cache.store_response() once it has it all.
+"""
+import os
+
+from llm_wrapper.budget import pack_documents
+from llm_wrapper.response_cache import lookup_response, response_key
+from llm_wrapper.tracing import span
+
+#-------------------------------------------------------------------
+apikeyfile = os.environ.get("OPENAI_API_KEY_FILE", "/mnt/sdc1/llm_text_apps/openai_api.txt")
+
+#-------------------------------------------------------------------
+class Prompt:
+    """Chunks fitted into the prompt (PromptBudget), the response cache key and the cached (answer, tier) or None."""
+
+    def __init__(self, budget, cache_key, cached):
+        self.budget = budget
+        self.cache_key = cache_key
+        self.cached = cached
+
+    @property
+    def documents(self):
+        return self.budget.documents
+
+def build_prompt(chain, documents, question, use_cache=True):
+    """Keep the best chunks that fit in the model's context, leaving room for the answer, and look the answer up."""
+    with span("prompt_build") as prompt_build:
+        budget = pack_documents(chain, documents, question)
+        # Same question over the same chunks and model: reuse the answer
+        cache_key = response_key(chain, budget.documents, question)
+        cached = lookup_response(cache_key) if use_cache else None
+        prompt_build.set("prompt_tokens", budget.prompt_tokens)
+        prompt_build.set("cache", cached[1] if cached is not None else "miss")
+    return Prompt(budget, cache_key, cached)
+
+def stream_answer(chain, documents, question):
+    """Iterator over the text of the answer, as the LLM generates it."""
+    inputs = chain._get_inputs(documents, question=question)
+    return chain.llm_chain.llm.stream(chain.llm_chain.prompt.format(**inputs))
+
+def invoke_answer(chain, documents, question):
+    return chain.invoke({"input_documents": documents, "question": question},return_only_outputs=True).get("output_text")
+
+#-------------------------------------------------------------------
+def read_api_key(filename=apikeyfile):
+    """The OpenAI API key, or "no_key" when its file is missing."""
+    try:
+        with open(filename, 'r') as f:
+            # It's assumed our file contains a single line,
+            # with our API key
+            return f.read().strip()
+    except FileNotFoundError:
+        return "no_key"
+
+def qa_chains(openai_api_key):
+    """(local, OpenAI) stuff question answering chains."""
+    from langchain.chains.question_answering import load_qa_chain
+    from langchain_openai import OpenAI
+
+    from llm_wrapper.webui import webuiLLM
+
+    llm_local = webuiLLM(max_tokens=2048)
+    llm_openai = OpenAI(openai_api_key=openai_api_key,model='gpt-3.5-turbo-instruct', max_tokens=1024)
+
+    # Load question answering chain
+    chain_local = load_qa_chain(llm_local, chain_type="stuff")
+    chain_openai = load_qa_chain(llm_openai, chain_type="stuff")
+
+    if "Helpful Answer:" in chain_local.llm_chain.prompt.template:
+        chain_local.llm_chain.prompt.template = (
+            f"### Human:{chain_local.llm_chain.prompt.template}".replace(
+                "Helpful Answer:", "\n### Assistant:"
+            )
+        )
+    return chain_local, chain_openai
@@ -0,0 +1,434 @@
+#----------------------------------------------------------------------------------------------------
+"""HTTP API over the ingest and question answering of the loader pages.
+
+    python -m llm_wrapper.api --pages HomePage.py    (start_api.sh: the API and the pages, in one process)
+    python -m llm_wrapper.api                        (the API alone)
+
+The same engine as the pages (llm_wrapper.sources, retrieval, answer, webui),
+without Streamlit, for scripted clients and load tests:
+
+    POST /knowledge-bases/files        multipart: files (PDFs, or plain-text files) + chunk_size, chunk_overlap, persist, index
+    POST /knowledge-bases              {"urls": [...]} or {"wikipedia": topic} or {"youtube": "IDs or URLs"}
+                                       (+ chunk_size, chunk_overlap, persist, index: "qdrant" or "numpy")
+    GET  /knowledge-bases/{id}         ingest progress
+    POST /knowledge-bases/{id}/search  {"question", "k"}: the chunks retrieved, with their scores
+    POST /knowledge-bases/{id}/ask     {"question", "k", "stream", "use_cache", "llm"}: the answer,
+                                       streamed as plain text with "stream": true
+    POST /knowledge-bases/{id}/batch   {"questions", "k", "use_cache", "llm"}: the answers with their
+                                       latency (llm_wrapper.batch), as CSV with ?format=csv
+    GET  /model, GET /models, POST /model/load {"model_name"}, POST /stop   (/model, /list, /load and /stop)
+
+The engine is blocking: every call runs in a worker thread, so the event loop
+keeps serving while answers are generated. LLM calls go through the queue of
+llm_wrapper.scheduler, each client by its IP: a full queue answers 503. A
+streamed answer abandoned by its client stops the generation on the backend.
+Knowledge bases are kept in memory like the pages' (KNOWLEDGE_BASE_CACHE_*),
+and reopened from disk when ingested with "persist".
+
+The queue and the vector store folder belong to one process. With --pages the
+API is served from a thread of the Streamlit server, and both share them. Run
+alone next to the pages, the API has its own queue (the backend then gets
+requests from both), and the process opening the vector store folder second
+gets 409 for "persist".
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+
+import requests
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from llm_wrapper.answer import build_prompt, invoke_answer, qa_chains, read_api_key, stream_answer
+from llm_wrapper.backend import client
+from llm_wrapper.batch import answer_batch, max_questions, pool_size, results_csv
+from llm_wrapper.logs import setup_logging
+from llm_wrapper.response_cache import store_response
+from llm_wrapper.retrieval import parse_brackets, retrieve
+from llm_wrapper.scheduler import SchedulerBusy, requester
+from llm_wrapper.sources import index_backend, ingest, pdf_source, text_source, url_source, wikipedia_source, youtube_source
+from llm_wrapper.stages import StageCache, knowledge_base_cache_entries, knowledge_base_cache_ttl
+from llm_wrapper.tracing import span
+from llm_wrapper.vectorstore import VectorStoreLocked
+
+#-------------------------------------------------------------------
+host = os.environ.get("API_HOST", "127.0.0.1")
+port = int(os.environ.get("API_PORT", "9093"))
+
+# Same framing of the question as the pages, by kind of content
+question_prefixes = {
+    "pdf": "This is a document for reference, based on this text ",
+    "text": "This is a document for reference, based on this text ",
+    "wikipedia": "This is a page content, based on this text ",
+    "url": "This is a page content, based on this text ",
+    "youtube": "This is a video transcript, based on this text ",
+}
+
+setup_logging()
+app = FastAPI(title="LLM Wrapper API")
+knowledge_bases = StageCache(knowledge_base_cache_entries, knowledge_base_cache_ttl)
+
+_chains = None
+_chains_lock = threading.Lock()
+# Worker threads still running, referenced until they finish
+_workers = set()
+
+#-------------------------------------------------------------------
+class SourceRequest(BaseModel):
+    urls: Optional[List[str]] = None
+    wikipedia: Optional[str] = None
+    youtube: Optional[str] = None
+    chunk_size: int = 1000
+    chunk_overlap: int = 200
+    persist: bool = False
+    index: str = index_backend
+
+class AskRequest(BaseModel):
+    question: str
+    k: int = 6
+    stream: bool = False
+    use_cache: bool = True
+    llm: str = "local"
+
+class BatchRequest(BaseModel):
+    questions: List[str]
+    k: int = 6
+    use_cache: bool = True
+    llm: str = "local"
+
+class SearchRequest(BaseModel):
+    question: str
+    k: int = 6
+
+class LoadRequest(BaseModel):
+    model_name: str
+
+class KnowledgeBase:
+    """An ingest job and the kind of content it indexes."""
+
+    def __init__(self, id, kind, job, errors=()):
+        self.id = id
+        self.kind = kind
+        self.job = job
+        self.errors = list(errors)
+
+    def status(self):
+        job = self.job
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "ready": job.ready.is_set() and job.error is None,
+            "finished": job.finished.is_set(),
+            "chunks": job.chunks_done,
+            "progress": job.progress,
+            "error": str(job.error) if job.error is not None else None,
+            "errors": [{"input": item, "error": str(error)} for item, error in self.errors],
+        }
+
+#-------------------------------------------------------------------
+@app.exception_handler(SchedulerBusy)
+async def scheduler_busy(request, exc):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "5"})
+
+@app.exception_handler(requests.RequestException)
+async def backend_error(request, exc):
+    logging.warning("[llm_wrapper][api] LLM backend error: "+repr(exc))
+    return JSONResponse({"detail": "LLM could not be contacted"}, status_code=502)
+
+def _client_address(request):
+    return request.client.host if request.client is not None else "api"
+
+def get_chains():
+    """(OpenAI API key, local chain, OpenAI chain), built on first use."""
+    global _chains
+    with _chains_lock:
+        if _chains is None:
+            key = read_api_key()
+            if key == "no_key":
+                logging.warning("[llm_wrapper][api] OpenAI API key not found - This API won't be available")
+            _chains = (key, *qa_chains(key))
+        return _chains
+
+def _chain(llm):
+    key, chain_local, chain_openai = get_chains()
+    if llm == "local":
+        return chain_local
+    if llm == "openai" and key != "no_key":
+        return chain_openai
+    raise HTTPException(400, "Unknown or unavailable llm: "+llm)
+
+async def _iterate_in_thread(make_iterator):
+    """Run a blocking iterator in a worker thread, yielding its items here.
+
+    The whole iteration stays in one thread (and one copy of the context, for
+    the tracing and requester context variables). Closing this generator stops
+    the worker at its next item and closes the blocking iterator.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # The event loop is closed, nobody is listening anymore
+            cancelled.set()
+
+    def work():
+        try:
+            iterator = make_iterator()
+            try:
+                for item in iterator:
+                    put((True, item))
+                    if cancelled.is_set():
+                        break
+            finally:
+                iterator.close()
+            put((False, None))
+        except Exception as e:
+            put((False, e))
+
+    worker = asyncio.ensure_future(asyncio.to_thread(work))
+    _workers.add(worker)
+    worker.add_done_callback(_workers.discard)
+    try:
+        while True:
+            more, item = await queue.get()
+            if not more:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        cancelled.set()
+
+#-------------------------------------------------------------------
+def _add_knowledge_base(kind, source, chunk_size, chunk_overlap, persist, backend):
+    from llm_wrapper.vectorstore import collection_name
+
+    # The same content chunked the same way is indexed once, like the pages' st.cache_resource
+    id = collection_name(source.source_hash, chunk_size, chunk_overlap)
+    if backend == "numpy" and not persist:
+        id += "_numpy"
+    entry = knowledge_bases.get(id)
+    if entry is None or entry.job.error is not None:
+        entry = KnowledgeBase(id, kind, ingest(source, chunk_size, chunk_overlap, persist, backend), source.errors)
+        knowledge_bases.put(id, entry)
+    return entry
+
+async def _ingest(kind, read_source, chunk_size, chunk_overlap, persist, backend, wait, inputs=None):
+    if backend not in ("qdrant", "numpy"):
+        raise HTTPException(400, "Unknown index: "+backend)
+    source = await asyncio.to_thread(read_source)
+    if source.errors and len(source.errors) == inputs:
+        raise HTTPException(422, {"message": "None of the inputs could be read",
+                                  "errors": [{"input": item, "error": str(error)} for item, error in source.errors]})
+    entry = await asyncio.to_thread(_add_knowledge_base, kind, source, chunk_size, chunk_overlap, persist, backend)
+    if wait:
+        # Like the pages, answer once the first batch is searchable
+        await asyncio.to_thread(entry.job.ready.wait)
+    status = entry.status()
+    if isinstance(entry.job.error, VectorStoreLocked):
+        return JSONResponse(status, status_code=409)
+    if entry.job.error is not None:
+        return JSONResponse(status, status_code=422)
+    return status
+
+@app.post("/knowledge-bases/files")
+async def add_files(files: List[UploadFile] = File(...), chunk_size: int = Form(1000), chunk_overlap: int = Form(200),
+                    persist: bool = Form(False), index: str = Form(index_backend), wait: bool = Form(True)):
+    contents = [await f.read() for f in files]
+    pdfs = [f.content_type == "application/pdf" or (f.filename or "").lower().endswith(".pdf") for f in files]
+    if all(pdfs):
+        return await _ingest("pdf", lambda: pdf_source(contents), chunk_size, chunk_overlap, persist, index, wait)
+    if any(pdfs):
+        raise HTTPException(400, "Upload PDFs and plain-text files separately")
+    return await _ingest("text", lambda: text_source(contents), chunk_size, chunk_overlap, persist, index, wait)
+
+@app.post("/knowledge-bases")
+async def add_source(body: SourceRequest, wait: bool = True):
+    if body.urls:
+        return await _ingest("url", lambda: url_source(tuple(body.urls)), body.chunk_size, body.chunk_overlap, body.persist, body.index, wait, len(body.urls))
+    if body.wikipedia:
+        return await _ingest("wikipedia", lambda: wikipedia_source(body.wikipedia), body.chunk_size, body.chunk_overlap, body.persist, body.index, wait)
+    if body.youtube:
+        from llm_wrapper.youtube import parse_video_ids
+
+        try:
+            video_ids = tuple(await asyncio.to_thread(parse_video_ids, body.youtube))
+        except Exception as e:
+            raise HTTPException(422, "Unable to read the playlist: "+str(e))
+        if not video_ids:
+            raise HTTPException(422, "No Youtube video found in this input")
+        return await _ingest("youtube", lambda: youtube_source(video_ids), body.chunk_size, body.chunk_overlap, body.persist, body.index, wait, len(video_ids))
+    raise HTTPException(400, "One of urls, wikipedia or youtube is required")
+
+def _get_knowledge_base(id):
+    entry = knowledge_bases.get(id)
+    if entry is None:
+        raise HTTPException(404, "Unknown knowledge base, or expired: ingest it again")
+    return entry
+
+async def _searchable(id):
+    entry = _get_knowledge_base(id)
+    await asyncio.to_thread(entry.job.ready.wait)
+    if entry.job.error is not None:
+        raise HTTPException(422, "Unable to index this content: "+str(entry.job.error))
+    return entry
+
+@app.get("/knowledge-bases/{id}")
+async def knowledge_base_status(id: str):
+    return _get_knowledge_base(id).status()
+
+#-------------------------------------------------------------------
+def _chunks(retrieval):
+    return [{"content": doc.page_content, "score": score, "metadata": doc.metadata} for doc, score in retrieval.docs_stats]
+
+@app.post("/knowledge-bases/{id}/search")
+async def search(id: str, body: SearchRequest, request: Request):
+    entry = await _searchable(id)
+    search_query, _ = parse_brackets(question_prefixes[entry.kind] + body.question.strip())
+
+    def run():
+        with span("api_search", **{"client.address": _client_address(request)}):
+            return retrieve(entry.job.knowledge_base, search_query, body.k)
+    return {"query": search_query, "chunks": _chunks(await asyncio.to_thread(run))}
+
+def _answer_events(entry, body, chain, user):
+    """Blocking side of /ask: ("prompt", (retrieval, prompt)), then ("token", text)... or ("answer", text)."""
+    search_query, question = parse_brackets(question_prefixes[entry.kind] + body.question.strip())
+    with span("api_ask", **{"client.address": user}), requester(user):
+        retrieval = retrieve(entry.job.knowledge_base, search_query, body.k)
+        prompt = build_prompt(chain, retrieval.documents, question, body.use_cache)
+        yield "prompt", (retrieval, prompt)
+        if prompt.cached is not None:
+            yield "answer", prompt.cached[0]
+            return
+        if body.stream:
+            response = ""
+            for token in stream_answer(chain, prompt.documents, question):
+                response += token
+                yield "token", token
+        else:
+            response = invoke_answer(chain, prompt.documents, question)
+            yield "answer", response
+        # Only complete answers are cached: an abandoned stream stops above
+        store_response(prompt.cache_key, response)
+
+@app.post("/knowledge-bases/{id}/ask")
+async def ask(id: str, body: AskRequest, request: Request):
+    entry = await _searchable(id)
+    chain = await asyncio.to_thread(_chain, body.llm)
+    events = _iterate_in_thread(lambda: _answer_events(entry, body, chain, _client_address(request)))
+    try:
+        _, (retrieval, prompt) = await anext(events)
+        # The first token (or the whole answer) comes once the LLM slot is granted: a full queue is still a 503
+        kind, text = await anext(events, ("token", ""))
+    except BaseException:
+        await events.aclose()
+        raise
+    budget = prompt.budget
+    info = {
+        "prompt_tokens": budget.prompt_tokens,
+        "chunks_dropped": budget.dropped,
+        "chunks_truncated": budget.truncated,
+        "cache": prompt.cached[1] if prompt.cached is not None else "miss",
+    }
+    if not body.stream:
+        return {"answer": text, **info, "chunks": _chunks(retrieval)}
+
+    async def tokens():
+        try:
+            yield text
+            async for _, token in events:
+                yield token
+        finally:
+            await events.aclose()
+    headers = {"X-" + key.replace("_", "-").title(): str(value) for key, value in info.items()}
+    return StreamingResponse(tokens(), media_type="text/plain; charset=utf-8", headers=headers)
+
+@app.post("/knowledge-bases/{id}/batch")
+async def batch(id: str, body: BatchRequest, request: Request, format: str = "json"):
+    entry = await _searchable(id)
+    chain = await asyncio.to_thread(_chain, body.llm)
+    questions = [question for question in body.questions if question.strip()]
+    if not questions:
+        raise HTTPException(400, "No question to answer")
+    if len(questions) > max_questions:
+        raise HTTPException(400, "At most "+str(max_questions)+" questions per batch")
+
+    def run():
+        start_time = time.perf_counter()
+        with span("api_batch", **{"client.address": _client_address(request)}), requester(_client_address(request)):
+            results = list(answer_batch(entry.job.knowledge_base, chain, questions, body.k,
+                                        question_prefixes[entry.kind], body.use_cache, pool_size(body.llm)))
+        return results, time.perf_counter() - start_time
+    results, seconds = await asyncio.to_thread(run)
+    if format == "csv":
+        return PlainTextResponse(results_csv(results), media_type="text/csv")
+    return {"seconds": round(seconds, 3), "answers": [result.row() for result in sorted(results, key=lambda result: result.index)]}
+
+#-------------------------------------------------------------------
+@app.get("/model")
+async def model():
+    response = await asyncio.to_thread(client.get, "/v1/internal/model/info")
+    response.raise_for_status()
+    return {"model_name": response.json()["model_name"]}
+
+@app.get("/models")
+async def models():
+    from llm_wrapper.webui import list_models
+
+    return {"models": await asyncio.to_thread(list_models)}
+
+@app.post("/model/load")
+async def load(body: LoadRequest):
+    from llm_wrapper.webui import load_model
+
+    if not await asyncio.to_thread(load_model, body.model_name):
+        raise HTTPException(404, "Model not in the list, see GET /models")
+    return {"model_name": body.model_name}
+
+@app.post("/stop")
+async def stop():
+    response = await asyncio.to_thread(client.post, "/v1/internal/stop-generation")
+    response.raise_for_status()
+    return {"stopped": True}
+
+#-------------------------------------------------------------------
+def serve_in_background():
+    """Serve the API from a daemon thread of this process."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port))
+    threading.Thread(target=server.run, name="api", daemon=True).start()
+    return server
+
+def main():
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="HTTP API of the loader pages")
+    parser.add_argument("--pages", metavar="SCRIPT", help="also run the Streamlit app SCRIPT in this process, sharing the LLM queue and the vector store")
+    parser.add_argument("--server-port", type=int, help="port of the Streamlit app")
+    args = parser.parse_args()
+    if args.pages is None:
+        uvicorn.run(app, host=host, port=port)
+        return
+
+    from streamlit.web import bootstrap
+
+    # The pages import the same llm_wrapper modules: one scheduler, one Qdrant client
+    serve_in_background()
+    flag_options = {"server_port": args.server_port}
+    bootstrap.load_config_options(flag_options)
+    bootstrap.run(args.pages, False, [], flag_options)
+
+if __name__ == "__main__":
+    main()
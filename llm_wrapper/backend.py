@@ -0,0 +1,118 @@
+#----------------------------------------------------------------------------------------------------
+"""Shared HTTP client for the text-generation-webui API.
+
+One pooled `requests.Session` per server process, with connect/read timeouts,
+bounded retries with backoff and a circuit breaker, so a hung or stopped
+backend fails fast instead of blocking the Streamlit script thread forever.
+Settings can be overridden with environment variables.
+"""
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+#-------------------------------------------------------------------
+base_url = os.environ.get("WEBUI_API_URL", "http://127.0.0.1:5000")
+connect_timeout = float(os.environ.get("WEBUI_CONNECT_TIMEOUT", "3.05"))
+read_timeout = float(os.environ.get("WEBUI_READ_TIMEOUT", "300"))
+# Loading a model can take minutes on big checkpoints
+load_timeout = float(os.environ.get("WEBUI_LOAD_TIMEOUT", "900"))
+# The model info is read before every local question (response cache key, context size)
+info_timeout = float(os.environ.get("WEBUI_INFO_TIMEOUT", "2"))
+max_retries = int(os.environ.get("WEBUI_MAX_RETRIES", "3"))
+backoff_factor = float(os.environ.get("WEBUI_BACKOFF_FACTOR", "0.5"))
+breaker_threshold = int(os.environ.get("WEBUI_BREAKER_THRESHOLD", "5"))
+breaker_reset_time = float(os.environ.get("WEBUI_BREAKER_RESET_TIME", "30"))
+
+#-------------------------------------------------------------------
+class BackendUnavailable(requests.ConnectionError):
+    """Raised without contacting the backend while the circuit breaker is open."""
+
+#-------------------------------------------------------------------
+class CircuitBreaker:
+    """Open after `threshold` consecutive failures, let one trial call through after `reset_time` seconds."""
+
+    def __init__(self, threshold=breaker_threshold, reset_time=breaker_reset_time):
+        self.threshold = threshold
+        self.reset_time = reset_time
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_time:
+                raise BackendUnavailable("LLM backend unavailable, retrying in {:.0f} s".format(
+                    self.reset_time - (time.monotonic() - self.opened_at)))
+            # Half-open: the next call is the trial, keep the others failing fast
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logging.warning("[llm_wrapper][backend][circuit_breaker] opened after {} failures".format(self.failures))
+                self.opened_at = time.monotonic()
+
+#-------------------------------------------------------------------
+class BackendClient:
+    """Pooled, keep-alive session for every call to the text-generation-webui API."""
+
+    def __init__(self, base_url=base_url, timeout=(connect_timeout, read_timeout), retries=max_retries,
+                 backoff_factor=backoff_factor, pool_size=10, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+
+        # Connection errors are retried for every method (nothing reached the server),
+        # read errors and 5xx only for idempotent GETs so a generation is never sent twice
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({'Accept': 'application/json'})
+
+    def request(self, method, path, **kwargs):
+        self.breaker.before_request()
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            response = self.session.request(method, self.base_url + path, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            self.breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+#-------------------------------------------------------------------
+client = BackendClient()
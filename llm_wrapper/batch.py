@@ -0,0 +1,127 @@
+#----------------------------------------------------------------------------------------------------
+"""Batch question answering over a knowledge base, without Streamlit.
+
+The questions are embedded in one encoder call and searched in one batch, then
+answered by a bounded pool of worker threads. Every generation still takes its
+slot in the LLM queue (llm_wrapper.scheduler) as the requester of the caller,
+so the pool for the local LLM is no larger than the user's share of the queue.
+"""
+import concurrent.futures
+import contextvars
+import csv
+import io
+import logging
+import os
+import time
+
+from llm_wrapper.answer import build_prompt, invoke_answer
+from llm_wrapper.response_cache import store_response
+from llm_wrapper.retrieval import parse_brackets, retrieve_batch
+from llm_wrapper.scheduler import SchedulerBusy, scheduler
+from llm_wrapper.tracing import span
+
+#-------------------------------------------------------------------
+batch_workers = int(os.environ.get("BATCH_WORKERS", "4"))
+max_questions = int(os.environ.get("BATCH_MAX_QUESTIONS", "200"))
+
+columns = ["question", "answer", "cache", "prompt_tokens", "seconds", "error"]
+
+#-------------------------------------------------------------------
+def read_questions(text="", csv_content=None):
+    """Questions pasted one per line, then those of a CSV file.
+
+    The CSV column named "question" is read when there is one, else the first
+    column of every row. Raises ValueError when the file is not UTF-8 CSV.
+    """
+    questions = [line.strip() for line in (text or "").splitlines() if line.strip()]
+    if csv_content:
+        try:
+            rows = [row for row in csv.reader(io.StringIO(csv_content.decode("utf-8-sig"))) if row]
+        except UnicodeDecodeError:
+            raise ValueError("The CSV file is not UTF-8 text, save it as \"CSV UTF-8\" and upload it again") from None
+        except csv.Error as e:
+            raise ValueError("Unable to read the CSV file: "+str(e)) from None
+        header = [cell.strip().lower() for cell in rows[0]] if rows else []
+        if "question" in header:
+            column = header.index("question")
+            rows = rows[1:]
+        else:
+            column = 0
+        questions += [row[column].strip() for row in rows if len(row) > column and row[column].strip()]
+    return questions
+
+def pool_size(llm_used):
+    """Workers for a batch: for the local LLM, no more than one user may have waiting in its queue."""
+    if llm_used == "local":
+        return max(1, min(batch_workers, scheduler.max_waiting_per_user))
+    return batch_workers
+
+#-------------------------------------------------------------------
+class BatchAnswer:
+    """Answer to one question of a batch, at its position in the batch."""
+
+    def __init__(self, index, question, answer="", cache="", prompt_tokens=0, seconds=0.0, error=None):
+        self.index = index
+        self.question = question
+        self.answer = answer
+        self.cache = cache
+        self.prompt_tokens = prompt_tokens
+        self.seconds = seconds
+        self.error = error
+
+    def row(self):
+        return {column: getattr(self, column) for column in columns}
+
+def _answer(index, question, prompt_question, retrieval, chain, use_cache):
+    start_time = time.perf_counter()
+    result = BatchAnswer(index, question)
+    with span("batch_answer", index=index):
+        try:
+            prompt = build_prompt(chain, retrieval.documents, prompt_question, use_cache)
+            result.prompt_tokens = prompt.budget.prompt_tokens
+            if prompt.cached is not None:
+                result.answer, result.cache = prompt.cached
+            else:
+                result.answer = invoke_answer(chain, prompt.documents, prompt_question)
+                result.cache = "miss"
+                store_response(prompt.cache_key, result.answer)
+        except SchedulerBusy:
+            result.error = "LLM busy"
+        except Exception as e:
+            logging.warning("[llm_wrapper][batch] question "+str(index)+" failed: "+repr(e))
+            result.error = "No response from LLM"
+    result.seconds = round(time.perf_counter() - start_time, 3)
+    return result
+
+def answer_batch(knowledge_base, chain, questions, k_value, prefix="", use_cache=True, workers=batch_workers):
+    """Answer the questions, yielding a BatchAnswer as each one is done.
+
+    `prefix` frames every question as the page does ("This is a document for
+    reference, based on this text "); [] narrows the search as in a single
+    question. Closing the generator cancels the questions not started yet.
+    """
+    if not questions:
+        return
+    search_queries, prompts = zip(*(parse_brackets(prefix + question.strip()) for question in questions))
+    retrievals = retrieve_batch(knowledge_base, list(search_queries), k_value)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        # Each question runs in a copy of the caller's context: its requester and trace
+        futures = [
+            pool.submit(contextvars.copy_context().run, _answer, index, question, prompt, retrieval, chain, use_cache)
+            for index, (question, prompt, retrieval) in enumerate(zip(questions, prompts, retrievals))
+        ]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+def results_csv(results):
+    """The results table as CSV text, in the order of the questions."""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=columns)
+    writer.writeheader()
+    for result in sorted(results, key=lambda result: result.index):
+        writer.writerow(result.row())
+    return output.getvalue()
@@ -0,0 +1,107 @@
+#----------------------------------------------------------------------------------------------------
+"""Fit the retrieved chunks into the model's context window.
+
+Token counts come from tiktoken when its encoding is available (it is only an
+approximation of the local model's tokenizer, hence the safety margin), or from
+a 4 characters per token estimate otherwise. The context size of the local
+backend is read from /v1/internal/model/info when it reports one, else
+LLM_CONTEXT_TOKENS is used.
+"""
+import logging
+import os
+import threading
+
+#-------------------------------------------------------------------
+context_tokens = int(os.environ.get("LLM_CONTEXT_TOKENS", "4096"))
+tokenizer_encoding = os.environ.get("PROMPT_TOKENIZER", "cl100k_base")
+safety_margin = float(os.environ.get("PROMPT_SAFETY_MARGIN", "0.9"))
+# A truncated chunk shorter than this is left out instead
+min_chunk_tokens = 64
+
+#-------------------------------------------------------------------
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def _get_encoding():
+    """tiktoken encoding, or False when tiktoken or its encoding file is unavailable."""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(tokenizer_encoding)
+                except:
+                    logging.warning("[llm_wrapper][budget] tiktoken unavailable, estimating tokens from the text length")
+                    _encoding = False
+    return _encoding
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4
+
+def truncate_tokens(text, tokens):
+    """The start of `text`, `tokens` tokens long."""
+    encoding = _get_encoding()
+    if encoding:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:tokens])
+    return text[:tokens * 4]
+
+#-------------------------------------------------------------------
+def context_window(llm):
+    """Context size in tokens of the model behind `llm`."""
+    from llm_wrapper.webui import model_info, webuiLLM
+
+    if isinstance(llm, webuiLLM):
+        info = model_info()
+        for key in ("n_ctx", "truncation_length", "max_seq_len"):
+            if isinstance(info.get(key), int) and info[key] > 0:
+                return info[key]
+    return context_tokens
+
+#-------------------------------------------------------------------
+class PromptBudget:
+    """Chunks that fit in the prompt, and what it took to make them fit."""
+
+    def __init__(self, documents, prompt_tokens, window, dropped, truncated):
+        self.documents = documents
+        self.prompt_tokens = prompt_tokens
+        self.window = window
+        self.dropped = dropped
+        self.truncated = truncated
+
+def pack_documents(chain, documents, question):
+    """Keep the best chunks (in retrieval order) that fit in a stuff chain's prompt.
+
+    Room is left for the answer (the LLM's max_tokens, at most half the
+    window, so a max_tokens as large as the window still leaves room for the
+    chunks). The last chunk that does not fit is truncated when enough of it remains, the following ones are
+    dropped.
+    """
+    from langchain_core.documents import Document
+
+    llm = chain.llm_chain.llm
+    window = context_window(llm)
+    reserved = min(getattr(llm, "max_tokens", None) or 256, window // 2)
+    budget = int((window - reserved) * safety_margin)
+
+    prompt_tokens = count_tokens(chain.llm_chain.prompt.format(**{chain.document_variable_name: "", "question": question}))
+    separator_tokens = count_tokens(chain.document_separator)
+    packed = []
+    truncated = 0
+    for doc in documents:
+        separator = separator_tokens if packed else 0
+        remaining = budget - prompt_tokens - separator
+        tokens = count_tokens(doc.page_content)
+        if tokens <= remaining:
+            packed.append(doc)
+            prompt_tokens += separator + tokens
+            continue
+        if remaining >= min_chunk_tokens:
+            packed.append(Document(page_content=truncate_tokens(doc.page_content, remaining), metadata=doc.metadata))
+            prompt_tokens += separator + remaining
+            truncated = 1
+        break
+    return PromptBudget(packed, prompt_tokens, window, len(documents) - len(packed), truncated)
@@ -0,0 +1,133 @@
+#----------------------------------------------------------------------------------------------------
+"""Conversation with the LLM, shared by the home page and the coder page.
+
+The LLMs are built once per server process, the conversation chains once per
+session (each user keeps their own memory). The functions render on the page
+running and log under its name (llm_wrapper.page.current_page()).
+"""
+import logging
+
+import streamlit as st
+
+from llm_wrapper.answer import apikeyfile
+from llm_wrapper.backend import client
+from llm_wrapper.page import current_page, get_file_contents, get_remote_ip
+from llm_wrapper.scheduler import SchedulerBusy, placeholder_feedback, requester
+from llm_wrapper.tracing import traced
+
+#-------------------------------------------------------------------
+@traced
+def prompting_llm(prompt,_chain,llm_used,stream=False,code=False):
+    page_name = current_page()
+    try:
+        # Local LLM calls queue behind other users, the placeholder shows the position while waiting
+        with st.spinner(text="Prompting LLM..."), requester(get_remote_ip(), placeholder_feedback(st.empty())):
+            logging.info("["+page_name+"][Prompt]["+get_remote_ip()+"]["+llm_used+"]: "+prompt)
+            if stream:
+                # Render the tokens (or the code) while the LLM generates them, then update the memory as invoke() would
+                inputs = _chain.prep_inputs({"input": prompt})
+                tokens = _chain.llm.stream(_chain.prompt.format(**inputs))
+                if code:
+                    code_placeholder = st.empty()
+                    response = ""
+                    for chunk in tokens:
+                        response += chunk
+                        code_placeholder.code(response)
+                else:
+                    response = st.write_stream(tokens)
+                _chain.memory.save_context({"input": prompt}, {"response": response})
+                response = response.replace("\n","  \n")
+            else:
+                response = _chain.invoke(prompt).get("response").replace("\n","  \n")
+            logging.info("["+page_name+"][Response]["+get_remote_ip()+"]["+llm_used+"]: "+response.replace("\n","\\n").strip())
+            return response
+    except SchedulerBusy:
+        logging.warning("["+page_name+"][prompting_llm]["+get_remote_ip()+"]LLM queue is full")
+        st.warning("The LLM is busy with other users, please try again in a moment")
+        return "LLM busy"
+    except Exception:
+        # Not BaseException: Streamlit stops or reruns the script with exceptions raised from the elements, even mid-stream
+        logging.warning("["+page_name+"][prompting_llm]["+get_remote_ip()+"]LLM could not be contacted")
+        st.error("LLM could not be contacted")
+        return "No response from LLM"
+
+#-------------------------------------------------------------------
+@traced
+def commands(prompt,last_prompt,last_response,llm_used,chain):
+    match prompt.split(" ")[0]:
+        case "/continue":
+            prompt = "Given this question: " + last_prompt.strip() + ", continue the following text you already started: " + last_response.rsplit("\n\n", 3)[0]
+            response = prompting_llm(prompt,chain,llm_used).replace("\n","  \n")
+            return response
+
+        case "/history":
+            try:
+                history = chain.memory.load_memory_variables({"history"}).get("history")
+                if history == "":
+                    return "No history to display"
+                else:
+                    return "Current History Summary:  \n" + history
+            except:
+                return "The history was cleared"
+
+        case "/list":
+            from llm_wrapper.webui import list_models
+            return "Model list:  \n" + """{}""".format("  \n".join(str(element) for element in list_models()))
+
+        case "/model":
+            r = client.get('/v1/internal/model/info')
+            r.raise_for_status()
+            return "Loaded model:  \n" + r.json()["model_name"]
+
+        case s if s.startswith('/load'):
+            from llm_wrapper.webui import load_model
+            model = prompt.split(" ")[1]
+            if load_model(model):
+                return "Ok, model changed."
+            else:
+                return "Model not in the list. Check the list with the /list command."
+
+        case "/recall":
+            return "Prompt: _"+last_prompt+"_  \n  \nResponse: "+last_response
+
+        case "/repeat":
+            prompt = last_prompt.strip()
+            response = prompting_llm(prompt,chain,llm_used).replace("\n","  \n")
+            return response
+
+        case "/stop":
+            r = client.post('/v1/internal/stop-generation')
+            r.raise_for_status()
+            if r.status_code == 200:
+                return "Ok, generation stopped."
+            else:
+                return "Stop command failed. Sometimes the LLM API becomes busy while generating text..."
+
+        case "/help":
+            return "Comand list available: /continue, /history, /list, /load, /model, /recall, /repeat, /stop, /help"
+
+#-------------------------------------------------------------------
+@st.cache_resource(show_spinner=False)
+def loading_llms():
+    from langchain_openai import OpenAI
+
+    from llm_wrapper.webui import webuiLLM
+
+    # Built once per server process and shared by every session
+    llm_local = webuiLLM()
+    OPENAI_API_KEY = get_file_contents(apikeyfile)
+    llm_openai = OpenAI(openai_api_key=OPENAI_API_KEY,model='gpt-3.5-turbo-instruct')
+    return OPENAI_API_KEY, llm_local, llm_openai
+
+def loading_chains(key="chains"):
+    from langchain.chains import ConversationChain
+
+    from llm_wrapper.memory import DeferredSummaryMemory
+
+    # Built once per session and page (key of the session state): each user keeps their own conversation memory
+    if key not in st.session_state:
+        OPENAI_API_KEY, llm_local, llm_openai = loading_llms()
+        chain_local = ConversationChain(llm=llm_local, memory=DeferredSummaryMemory(llm=llm_local,max_token_limit=500), verbose=False)
+        chain_openai = ConversationChain(llm=llm_openai, memory=DeferredSummaryMemory(llm=llm_openai,max_token_limit=500), verbose=False)
+        st.session_state[key] = (chain_local, chain_openai)
+    return st.session_state[key]
@@ -0,0 +1,90 @@
+#----------------------------------------------------------------------------------------------------
+"""Content-addressed cache of chunk embeddings, stored in SQLite.
+
+Keys are the SHA-256 of the embeddings model name and the chunk text, so a chunk
+is only ever encoded once per model, whatever document or chunking produced it.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+#-------------------------------------------------------------------
+cache_path = os.environ.get("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite")
+
+#-------------------------------------------------------------------
+def chunk_key(model_name, text):
+    return hashlib.sha256((model_name + "\0" + text).encode("utf-8")).hexdigest()
+
+#-------------------------------------------------------------------
+class EmbeddingCache:
+    """Thread-safe key → float32 vector store."""
+
+    def __init__(self, path=cache_path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys found in the cache."""
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._connection.execute(
+                    "SELECT key, vector FROM embeddings WHERE key IN ({})".format(",".join("?" * len(batch))), batch)
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items])
+
+#-------------------------------------------------------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the process-wide cache, or None when disabled (empty EMBEDDING_CACHE_PATH) or unavailable."""
+    global _cache
+    if _cache is None and cache_path:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = EmbeddingCache(cache_path)
+                except (OSError, sqlite3.Error):
+                    logging.warning("[llm_wrapper][embedding_cache] unable to open "+cache_path, exc_info=True)
+                    return None
+    return _cache
+
+#-------------------------------------------------------------------
+def embed_documents_cached(model, model_name, texts):
+    """Embed texts with `model`, encoding only the ones missing from the cache."""
+    cache = get_cache()
+    if cache is None:
+        return model.embed_documents(texts)
+
+    keys = [chunk_key(model_name, text) for text in texts]
+    vectors = cache.get_many(list(set(keys)))
+    # Encode each missing text once, even when it is repeated in the batch
+    missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+    if missing:
+        new_vectors = model.embed_documents(list(missing.values()))
+        new_items = list(zip(missing.keys(), new_vectors))
+        cache.put_many(new_items)
+        vectors.update(new_items)
+    logging.info("[llm_wrapper][embedding_cache] {} chunks, {} encoded".format(len(texts), len(missing)))
+    return [vectors[key] for key in keys]
@@ -0,0 +1,86 @@
+#----------------------------------------------------------------------------------------------------
+"""Process-wide embeddings model shared by every page and every Streamlit session.
+
+Streamlit imports this module once per server process, so the model held here is
+loaded a single time no matter how many users or pages are active.
+"""
+import logging
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from llm_wrapper.embedding_cache import embed_documents_cached
+
+#-------------------------------------------------------------------
+model_name = "flax-sentence-embeddings/all_datasets_v4_MiniLM-L6"
+
+_model = None
+_lock = threading.Lock()
+_warm_up_thread = None
+
+#-------------------------------------------------------------------
+def _load_model():
+    """Load the sentence-transformer model on first use."""
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                start_time = time.perf_counter()
+                # langchain_huggingface and sentence-transformers (torch) are only imported here
+                from langchain_huggingface import HuggingFaceEmbeddings as SentenceTransformerEmbeddings
+                _model = SentenceTransformerEmbeddings(model_name=model_name)
+                logging.info("[llm_wrapper][embeddings]["+model_name+"] loaded in {:.3f} s".format(
+                    time.perf_counter() - start_time))
+    return _model
+
+def use_model(model):
+    """Replace the shared model by another Embeddings object (offline runs, benchmarks)."""
+    global _model
+    with _lock:
+        _model = model
+
+#-------------------------------------------------------------------
+class SharedEmbeddings(Embeddings):
+    """Handle to the process-wide model.
+
+    It pickles by reference, so a pickled knowledge base never carries (or
+    restores) its own copy of the model weights.
+    """
+
+    def embed_documents(self, texts):
+        # Chunks already seen by any page are read back from the embedding cache
+        return embed_documents_cached(_load_model(), model_name, texts)
+
+    def embed_query(self, text):
+        return _load_model().embed_query(text)
+
+    def embed_queries(self, texts):
+        """Embed several questions in one encoder call, bypassing the embedding cache."""
+        return _load_model().embed_documents(list(texts))
+
+    def __reduce__(self):
+        return (get_embeddings, ())
+
+_shared_embeddings = SharedEmbeddings()
+
+def get_embeddings():
+    """Return the shared embeddings handle."""
+    return _shared_embeddings
+
+#-------------------------------------------------------------------
+def warm_up():
+    """Load the embeddings model in a background thread, once per process."""
+    global _warm_up_thread
+    with _lock:
+        if _model is not None or _warm_up_thread is not None:
+            return
+        _warm_up_thread = threading.Thread(target=_warm_up, name="embeddings-warm-up", daemon=True)
+        _warm_up_thread.start()
+
+def _warm_up():
+    try:
+        # Encoding once also initialises the tokenizer and the torch kernels
+        _load_model().embed_query("warm up")
+    except Exception:
+        logging.warning("[llm_wrapper][embeddings][warm_up] unable to load "+model_name, exc_info=True)
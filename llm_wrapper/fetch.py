@@ -0,0 +1,211 @@
+#----------------------------------------------------------------------------------------------------
+"""Concurrent web page fetching with an on-disk HTTP cache.
+
+Pages are fetched by one pooled httpx.AsyncClient running on a background event
+loop, shared by every session. Responses are kept in SQLite with their ETag and
+Last-Modified validators: fresh entries (Cache-Control max-age) are served
+without a request, stale ones are revalidated with a conditional GET, and a
+cached copy is used when the site cannot be reached.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+#-------------------------------------------------------------------
+cache_path = os.environ.get("HTTP_CACHE_PATH", "cache/http.sqlite")
+connect_timeout = float(os.environ.get("FETCH_CONNECT_TIMEOUT", "5"))
+read_timeout = float(os.environ.get("FETCH_READ_TIMEOUT", "20"))
+concurrency = int(os.environ.get("FETCH_CONCURRENCY", "8"))
+max_bytes = int(os.environ.get("FETCH_MAX_BYTES", str(10 * 1024 * 1024)))
+wikipedia_api = "https://en.wikipedia.org/w/api.php"
+user_agent = "Mozilla/5.0 (compatible; LangChain_Wrapper_LocalLLM)"
+
+max_age = re.compile(r"max-age=(\d+)")
+
+#-------------------------------------------------------------------
+class FetchedPage:
+    def __init__(self, url, body, encoding, content_type, from_cache=False):
+        self.url = url
+        self.body = body
+        self.encoding = encoding
+        self.content_type = content_type
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.body.decode(self.encoding or "utf-8", errors="replace")
+
+#-------------------------------------------------------------------
+class HttpCache:
+    """Thread-safe url → (validators, body) store."""
+
+    def __init__(self, path=cache_path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                "expires REAL NOT NULL, encoding TEXT, content_type TEXT, body BLOB NOT NULL)")
+
+    def get(self, url):
+        """Return the cached row as a dict, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT etag, last_modified, expires, encoding, content_type, body FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("etag", "last_modified", "expires", "encoding", "content_type", "body"), row))
+
+    def put(self, url, etag, last_modified, expires, encoding, content_type, body):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, expires, encoding, content_type, body) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, expires, encoding, content_type, body))
+
+    def touch(self, url, expires):
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE pages SET expires = ? WHERE url = ?", (expires, url))
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the process-wide cache, or None when disabled (empty HTTP_CACHE_PATH) or unavailable."""
+    global _cache
+    if _cache is None and cache_path:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = HttpCache(cache_path)
+                except (OSError, sqlite3.Error):
+                    logging.warning("[llm_wrapper][fetch] unable to open "+cache_path, exc_info=True)
+                    return None
+    return _cache
+
+#-------------------------------------------------------------------
+# Background event loop owning the pooled client
+_loop = None
+_client = None
+_semaphore = None
+_loop_lock = threading.Lock()
+
+def _get_loop():
+    global _loop, _client, _semaphore
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-wrapper-fetch", daemon=True).start()
+
+            # Imported on first use, like the other heavy dependencies (see llm_wrapper.prewarm)
+            import httpx
+
+            async def setup():
+                client = httpx.AsyncClient(
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                    limits=httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency),
+                    follow_redirects=True,
+                    headers={"User-Agent": user_agent})
+                return client, asyncio.Semaphore(concurrency)
+
+            _client, _semaphore = asyncio.run_coroutine_threadsafe(setup(), loop).result()
+            _loop = loop
+    return _loop
+
+def _expires(response):
+    match = max_age.search(response.headers.get("Cache-Control", ""))
+    if match is None or "no-store" in response.headers.get("Cache-Control", ""):
+        return 0.0
+    return time.time() + int(match.group(1))
+
+async def _fetch(url):
+    import httpx
+
+    # SQLite calls block: they run in the default executor, not on the event loop every fetch shares
+    cache = await asyncio.to_thread(get_cache)
+    cached = await asyncio.to_thread(cache.get, url) if cache is not None else None
+    if cached is not None and cached["expires"] > time.time():
+        return FetchedPage(url, cached["body"], cached["encoding"], cached["content_type"], from_cache=True)
+
+    headers = {}
+    if cached is not None:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    try:
+        async with _semaphore:
+            async with _client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached is not None:
+                    await asyncio.to_thread(cache.touch, url, _expires(response))
+                    return FetchedPage(url, cached["body"], cached["encoding"], cached["content_type"], from_cache=True)
+                response.raise_for_status()
+                if int(response.headers.get("Content-Length") or 0) > max_bytes:
+                    raise ValueError("Page larger than {} bytes".format(max_bytes))
+                # Appended in place: concatenating bytes would copy the whole body for every chunk
+                buffer = bytearray()
+                async for data in response.aiter_bytes():
+                    buffer += data
+                    if len(buffer) > max_bytes:
+                        raise ValueError("Page larger than {} bytes".format(max_bytes))
+                body = bytes(buffer)
+                encoding = response.encoding
+    except (httpx.HTTPError, ValueError) as error:
+        if cached is None:
+            raise
+        logging.warning("[llm_wrapper][fetch] "+url+" unreachable ("+repr(error)+"), using the cached copy")
+        return FetchedPage(url, cached["body"], cached["encoding"], cached["content_type"], from_cache=True)
+
+    content_type = response.headers.get("Content-Type", "")
+    if cache is not None and "no-store" not in response.headers.get("Cache-Control", ""):
+        await asyncio.to_thread(cache.put, url, response.headers.get("ETag"), response.headers.get("Last-Modified"), _expires(response),
+                                encoding, content_type, body)
+    return FetchedPage(url, body, encoding, content_type)
+
+async def _fetch_all(urls):
+    return await asyncio.gather(*(_fetch(url) for url in urls), return_exceptions=True)
+
+#-------------------------------------------------------------------
+def fetch_urls(urls):
+    """Fetch the URLs concurrently; returns a FetchedPage or the exception raised, in order."""
+    return asyncio.run_coroutine_threadsafe(_fetch_all(list(urls)), _get_loop()).result()
+
+def fetch_url(url):
+    """Fetch one URL, raising on failure."""
+    result = fetch_urls([url])[0]
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+def split_urls(text):
+    """URLs typed in one input, separated by spaces, commas or new lines."""
+    return [url for url in re.split(r"[\s,]+", text) if url]
+
+def wikipedia_summaries(topic, results=3, max_chars=4000):
+    """Introductions of the best Wikipedia matches for a topic, in one API request.
+
+    Same output as langchain's WikipediaAPIWrapper: "Page: ...\nSummary: ..."
+    blocks, cut to `max_chars`.
+    """
+    query = urllib.parse.urlencode({
+        "action": "query", "format": "json", "generator": "search", "gsrsearch": topic, "gsrlimit": results,
+        "prop": "extracts", "exintro": 1, "explaintext": 1, "exlimit": results, "redirects": 1,
+    })
+    pages = json.loads(fetch_url(wikipedia_api + "?" + query).text).get("query", {}).get("pages", {})
+    summaries = [
+        "Page: " + page["title"] + "\nSummary: " + page.get("extract", "")
+        for page in sorted(pages.values(), key=lambda page: page.get("index", 0))
+    ]
+    if not summaries:
+        return "No good Wikipedia Search Result was found"
+    return "\n\n".join(summaries)[:max_chars]
@@ -0,0 +1,148 @@
+#----------------------------------------------------------------------------------------------------
+"""Main-content text extraction from HTML pages.
+
+Scripts, styles, navigation, headers, footers, forms and elements whose class
+or id look like boilerplate (menus, sidebars, cookie banners, comments...) are
+removed first. The remaining paragraphs score their parent and grandparent
+containers, readability style (text length and commas, penalised by link
+density). The best container, widened to its ancestors until it holds most of
+the page's text, and its well scoring siblings are kept: their paragraphs that
+are not mostly links are returned in document order, one per block.
+"""
+import re
+
+import lxml.html
+from lxml import etree
+
+#-------------------------------------------------------------------
+removed_tags = ["script", "style", "noscript", "template", "svg", "canvas", "iframe", "object", "embed",
+                "nav", "header", "footer", "aside", "form", "button", "select", "input", "textarea", "menu"]
+block_tags = {"p", "pre", "blockquote", "li", "dd", "dt", "td", "th", "figcaption",
+              "h1", "h2", "h3", "h4", "h5", "h6"}
+heading_tags = {"h1", "h2", "h3", "h4", "h5", "h6"}
+# Never removed for their class or id, e.g. <a class="header"> anchors in headings
+inline_tags = {"a", "span", "em", "strong", "b", "i", "code", "kbd", "small", "sup", "sub", "mark"}
+boilerplate = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|breadcrumbs?|sidebar|footer|header|masthead|banner|cookies?|consent|gdpr|"
+    r"share|sharing|social|comments?|related|recommended|promo|advert|ads?|sponsor|newsletter|subscribe|"
+    r"popup|modal|toolbar|pagination|skip)([\s_-]|$)", re.I)
+positive = re.compile(r"(^|[\s_-])(article|content|main|post|entry|story|body|text|page)([\s_-]|$)", re.I)
+whitespace = re.compile(r"\s+")
+
+min_paragraph_chars = 25
+max_link_density = 0.5
+# Share of the clean paragraph text the kept containers must hold
+min_coverage = 0.6
+
+#-------------------------------------------------------------------
+def _text(element):
+    if element.tag == "pre":
+        # Keep the lines of code blocks
+        return "\n".join(line.rstrip() for line in element.text_content().strip("\n").splitlines())
+    return whitespace.sub(" ", element.text_content()).strip()
+
+def _link_density(element, length):
+    if not length:
+        return 1.0
+    return sum(len(_text(link)) for link in element.iter("a")) / length
+
+def _is_boilerplate(element):
+    names = (element.get("class") or "") + " " + (element.get("id") or "")
+    if element.get("role") in ("navigation", "banner", "contentinfo", "complementary", "search"):
+        return True
+    if element.get("aria-hidden") == "true" or element.get("hidden") is not None:
+        return True
+    return bool(names.strip()) and boilerplate.search(names) is not None and positive.search(names) is None
+
+def _clean(root):
+    etree.strip_elements(root, etree.Comment, with_tail=False)
+    etree.strip_elements(root, *removed_tags, with_tail=False)
+    for element in list(root.iter(etree.Element)):
+        if element.getparent() is not None and element.tag not in ("html", "body") and element.tag not in inline_tags and _is_boilerplate(element):
+            element.drop_tree()
+
+def _blocks(root):
+    """(element, text) of the innermost block elements, in document order."""
+    blocks = []
+    for element in root.iter(*block_tags):
+        # A <li> or <td> wrapping paragraphs is represented by the paragraphs
+        if element.tag not in heading_tags and any(True for _ in element.iterdescendants(*block_tags)):
+            continue
+        text = _text(element)
+        if text:
+            blocks.append((element, text))
+    return blocks
+
+def _container_bonus(element):
+    names = (element.get("class") or "") + " " + (element.get("id") or "")
+    bonus = 0.0
+    if element.tag in ("article", "main"):
+        bonus += 25
+    if positive.search(names):
+        bonus += 25
+    return bonus
+
+#-------------------------------------------------------------------
+def extract_paragraphs(html):
+    """Paragraphs of the page's main content, in document order."""
+    if isinstance(html, str):
+        # lxml refuses str input carrying an encoding declaration
+        html = html.encode("utf-8")
+    try:
+        root = lxml.html.fromstring(html, parser=lxml.html.HTMLParser(encoding="utf-8", remove_comments=True))
+    except (etree.ParserError, ValueError):
+        return []
+    _clean(root)
+    blocks = _blocks(root)
+    if not blocks:
+        # Bare text without any block element
+        text = _text(root)
+        return [text] if text else []
+
+    # Readability style scoring of the containers of each paragraph
+    scores = {}
+    for element, text in blocks:
+        if element.tag in heading_tags or len(text) < min_paragraph_chars:
+            continue
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        for level, container in enumerate((element.getparent(), element.getparent().getparent() if element.getparent() is not None else None)):
+            if container is None:
+                break
+            if container not in scores:
+                scores[container] = _container_bonus(container)
+            scores[container] += score / (level + 1)
+    for container in scores:
+        length = len(_text(container))
+        scores[container] *= 1 - _link_density(container, length)
+
+    def clean(element, text):
+        return element.tag in heading_tags or (len(text) >= min_paragraph_chars and _link_density(element, len(text)) <= max_link_density)
+
+    def covered(containers):
+        return sum(len(text) for element, text in blocks
+                   if clean(element, text) and any(container in element.iterancestors() for container in containers))
+
+    keep = None
+    if scores:
+        top = max(scores, key=scores.get)
+        # Documentation pages split their text between many sections: widen until most of it is kept
+        total = sum(len(text) for element, text in blocks if clean(element, text))
+        while top.getparent() is not None and covered([top]) < total * min_coverage:
+            top = top.getparent()
+        threshold = max(10.0, scores.get(top, 0) * 0.2)
+        keep = [top] + [sibling for sibling in top.itersiblings() if scores.get(sibling, 0) >= threshold] \
+                     + [sibling for sibling in top.itersiblings(preceding=True) if scores.get(sibling, 0) >= threshold]
+
+    paragraphs = []
+    for element, text in blocks:
+        if keep is not None and not any(container in element.iterancestors() for container in keep):
+            # The page title usually sits next to the body rather than in it
+            if not (element.tag in heading_tags and top.getparent() in element.iterancestors()):
+                continue
+        if clean(element, text):
+            paragraphs.append(text.rstrip("¶ ") if element.tag in heading_tags else text)
+    return paragraphs
+
+def extract_text(html):
+    """Main content of an HTML page as plain text, one paragraph per block."""
+    return "\n\n".join(extract_paragraphs(html))
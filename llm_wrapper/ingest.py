@@ -0,0 +1,179 @@
+#----------------------------------------------------------------------------------------------------
+"""Streaming ingest pipeline shared by the loader pages.
+
+Text segments (PDF pages, files, transcripts, web pages) are chunked as they
+arrive, embedded in fixed-size batches and upserted batch by batch, so memory
+is bounded by the batch size rather than the document size and the knowledge
+base can be queried as soon as its first batch is indexed. The stage caches
+(llm_wrapper.stages) also keep the pages and chunks of a source, up to
+DOCUMENT_CACHE_BYTES and CHUNK_CACHE_BYTES of text.
+"""
+import logging
+import os
+import re
+import threading
+
+from langchain.text_splitter import CharacterTextSplitter
+
+from llm_wrapper import embeddings
+from llm_wrapper.tracing import span
+from llm_wrapper.vectorstore import add_chunks, new_knowledge_base, publish_knowledge_base
+
+#-------------------------------------------------------------------
+batch_size = int(os.environ.get("INGEST_BATCH_SIZE", "64"))
+
+#-------------------------------------------------------------------
+def _last_chunk_start(text, chunk):
+    """Offset in `text` of the lines the last chunk split from it was made of.
+
+    The splitter drops empty lines and strips the chunk, so the chunk is matched
+    against the text's last non-empty lines, one more at a time.
+    """
+    lines = list(re.finditer(r"[^\n]+", text))
+    for count in range(1, len(lines) + 1):
+        if "\n".join(line.group() for line in lines[-count:]).strip() == chunk:
+            return lines[-count].start()
+    return None
+
+def iter_chunks(segments, chunk_size, chunk_overlap):
+    """Split a stream of text segments into chunks without joining the whole text first.
+
+    Segments are concatenated as they come. Once the pending text is a few chunks
+    long it is split and every chunk but the last is emitted; the last one may
+    still grow with the next segment, so it is carried over.
+    """
+    text_splitter = CharacterTextSplitter(
+        separator="\n", chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len
+    )
+    window = chunk_size * 4
+    pending = ''
+    for segment in segments:
+        pending += segment
+        if len(pending) < window:
+            continue
+        chunks = text_splitter.split_text(pending)
+        if len(chunks) < 2:
+            continue
+        start = _last_chunk_start(pending, chunks[-1])
+        if start is None:
+            continue
+        yield from chunks[:-1]
+        # The raw text, not the chunk: the chunk is stripped, and its end may be the middle of a line
+        pending = pending[start:]
+    yield from text_splitter.split_text(pending)
+
+def iter_batches(items, size):
+    """Group an iterable in lists of `size` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+#-------------------------------------------------------------------
+class IngestJob:
+    """Extract → chunk → embed → upsert, running in a background thread.
+
+    `ready` is set once the first batch is searchable (or the job failed), and
+    `finished` once every chunk is indexed. Persistent knowledge bases are
+    published under `name` only when complete. `chunker` turns the segments
+    into chunks: plain strings, or (text, metadata) pairs. `backend` is the
+    in-memory index, "qdrant" or "numpy" (vectorstore.new_knowledge_base).
+    """
+
+    def __init__(self, segments, chunk_size, chunk_overlap, name=None, total_segments=None, batch_size=batch_size, chunker=None,
+                 backend="qdrant"):
+        self.segments = segments
+        self.chunker = chunker or iter_chunks
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.name = name
+        self.total_segments = total_segments
+        self.batch_size = batch_size
+        self.backend = backend
+        self.knowledge_base = None
+        self.segments_done = 0
+        self.chunks_done = 0
+        self.error = None
+        self.ready = threading.Event()
+        self.finished = threading.Event()
+
+    @classmethod
+    def from_knowledge_base(cls, knowledge_base):
+        """Wrap an already indexed knowledge base as a finished job."""
+        job = cls([], 0, 0)
+        job.knowledge_base = knowledge_base
+        job.ready.set()
+        job.finished.set()
+        return job
+
+    @classmethod
+    def from_error(cls, error):
+        """A job that failed before it started."""
+        job = cls([], 0, 0)
+        job.error = error
+        job.ready.set()
+        job.finished.set()
+        return job
+
+    @property
+    def progress(self):
+        """Fraction of the segments consumed, when their number is known."""
+        if self.finished.is_set():
+            return 1.0
+        if not self.total_segments:
+            return 0.0
+        return min(self.segments_done / self.total_segments, 1.0)
+
+    def start(self):
+        threading.Thread(target=self.run, name="ingest", daemon=True).start()
+        return self
+
+    def run(self):
+        try:
+            with span("ingest", chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap, persistent=self.name is not None,
+                      backend=self.backend) as ingest:
+                batches = iter_batches(self.chunker(self._count_segments(), self.chunk_size, self.chunk_overlap), self.batch_size)
+                while True:
+                    # Segments are parsed lazily: pulling a batch runs the parsing and the chunking
+                    with span("parse_chunk"):
+                        batch = next(batches, None)
+                    if batch is None:
+                        break
+                    texts = [chunk if isinstance(chunk, str) else chunk[0] for chunk in batch]
+                    metadatas = [None if isinstance(chunk, str) else chunk[1] for chunk in batch]
+                    with span("embed", chunks=len(texts)):
+                        vectors = embeddings.get_embeddings().embed_documents(texts)
+                    with span("index", chunks=len(texts)):
+                        if self.knowledge_base is None:
+                            self.knowledge_base = new_knowledge_base(len(vectors[0]), self.name, self.backend)
+                        add_chunks(self.knowledge_base, texts, vectors, metadatas)
+                    self.chunks_done += len(batch)
+                    if not self.ready.is_set():
+                        ingest.event("first_batch_ready")
+                    self.ready.set()
+                ingest.set("chunks", self.chunks_done)
+                if self.knowledge_base is None:
+                    raise ValueError("No text found in the content")
+                if self.name is not None:
+                    self.knowledge_base = publish_knowledge_base(self.knowledge_base, self.name)
+        except Exception as e:
+            logging.warning("[llm_wrapper][ingest] ingest failed", exc_info=True)
+            self.error = e
+        finally:
+            self.segments = None
+            self.ready.set()
+            self.finished.set()
+
+    def _count_segments(self):
+        for segment in self.segments:
+            yield segment
+            self.segments_done += 1
+
+#-------------------------------------------------------------------
+def start_ingest(segments, chunk_size, chunk_overlap, name=None, total_segments=None, chunker=None, backend="qdrant"):
+    """Start indexing `segments` in the background and return the job."""
+    return IngestJob(segments, chunk_size, chunk_overlap, name, total_segments, chunker=chunker, backend=backend).start()
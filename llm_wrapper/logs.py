@@ -0,0 +1,19 @@
+#----------------------------------------------------------------------------------------------------
+"""Log file shared by the pages and the API."""
+import logging
+import os
+
+#-------------------------------------------------------------------
+log_filename = os.environ.get("LOG_FILENAME", "logs/llm_wrapper.log")
+
+def setup_logging():
+    """Log to log_filename, once per process."""
+    import langchain
+    langchain.verbose = False
+    logging.basicConfig(
+    filename=log_filename,
+    format='%(asctime)s %(levelname)-2s %(message)s',
+    level=logging.INFO,
+    datefmt='%Y-%m-%d %H:%M:%S')
+
+    logging.getLogger('CharacterTextSplitter').disabled = True
@@ -0,0 +1,89 @@
+#----------------------------------------------------------------------------------------------------
+"""Conversation memory whose summary is updated off the request path."""
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Dict, List
+
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain_core.messages import BaseMessage, get_buffer_string
+
+from llm_wrapper.budget import count_tokens
+from llm_wrapper.tracing import span
+
+#-------------------------------------------------------------------
+# A single worker: summaries run one at a time, in the order the turns happened
+_worker = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+# Guards pending_messages, updated by the request thread and the worker
+_pending_lock = threading.Lock()
+
+def estimate_tokens(messages):
+    """Token count of the turns, without asking the LLM to tokenize them."""
+    return count_tokens(get_buffer_string(messages))
+
+#-------------------------------------------------------------------
+class DeferredSummaryMemory(ConversationSummaryBufferMemory):
+    """Rolling window of raw turns plus a summary updated in the background.
+
+    Recent turns are kept verbatim. Once they exceed `max_token_limit`, the
+    oldest ones are handed to a background worker that folds them into the
+    summary, so saving a turn never waits for a second LLM round-trip. Turns
+    being summarised stay in the history until the new summary replaces them;
+    when a summary fails, its turns are folded into the next one.
+    """
+
+    pending_messages: List[BaseMessage] = []
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Return summary, turns being summarised and recent turns."""
+        with _pending_lock:
+            buffer = list(self.pending_messages) + self.chat_memory.messages
+        if self.moving_summary_buffer != "":
+            buffer = [self.summary_message_cls(content=self.moving_summary_buffer)] + buffer
+        if self.return_messages:
+            return {self.memory_key: buffer}
+        return {self.memory_key: get_buffer_string(buffer, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """Save the turn and prune the window."""
+        with span("memory_update"):
+            super().save_context(inputs, outputs)
+
+    def prune(self) -> None:
+        """Move the oldest turns out of the window and summarise them in the background."""
+        buffer = self.chat_memory.messages
+        if estimate_tokens(buffer) <= self.max_token_limit:
+            return
+        pruned_memory = []
+        # Drop whole exchanges (human + AI) and always keep the latest one verbatim
+        while len(buffer) > 2 and estimate_tokens(buffer) > self.max_token_limit:
+            pruned_memory.extend(buffer[:2])
+            del buffer[:2]
+        if pruned_memory:
+            with _pending_lock:
+                self.pending_messages = self.pending_messages + pruned_memory
+            _worker.submit(self._summarise)
+
+    def _summarise(self):
+        # Every turn still pending, including those of a summary that failed before
+        with _pending_lock:
+            pruned_memory = list(self.pending_messages)
+        if not pruned_memory:
+            return
+        try:
+            with span("memory_summary", messages=len(pruned_memory)):
+                summary = self.predict_new_summary(pruned_memory, self.moving_summary_buffer)
+        except Exception:
+            # The turns stay in the history verbatim, the next summary retries them
+            logging.warning("[llm_wrapper][memory] summary update failed", exc_info=True)
+            return
+        summarised = {id(message) for message in pruned_memory}
+        with _pending_lock:
+            self.moving_summary_buffer = summary
+            self.pending_messages = [message for message in self.pending_messages if id(message) not in summarised]
+
+    def clear(self) -> None:
+        """Clear memory contents."""
+        super().clear()
+        with _pending_lock:
+            self.pending_messages = []
@@ -0,0 +1,86 @@
+#----------------------------------------------------------------------------------------------------
+"""In-memory knowledge base searched in a NumPy matrix, without Qdrant.
+
+For the usual session (one document, a few hundred chunks) the in-memory
+Qdrant client costs more than the search itself: collection setup, point
+structs and payload copies on every upsert and query. Here the chunk vectors
+are the normalised rows of one float32 matrix: a search is one matrix product
+and an argpartition, and several queries are searched with a single product.
+Scores are cosine similarities, as Qdrant's. The matrix is not kept in float16:
+NumPy has no BLAS product for it, and converting it back for every search
+costs several times the search itself.
+"""
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+
+#-------------------------------------------------------------------
+def _normalised(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+#-------------------------------------------------------------------
+class NumpyKnowledgeBase:
+    """Knowledge base with the search methods of vectorstore.KnowledgeBase.
+
+    Chunks can be added while it is searched: the matrix grows by doubling and
+    a search only reads the rows already written.
+    """
+
+    def __init__(self, embeddings, vector_size):
+        self.embeddings = embeddings
+        self.lock = threading.RLock()
+        self.documents = []
+        self._matrix = np.empty((0, vector_size), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        """Memory used by the vectors."""
+        return self._matrix.nbytes
+
+    def add(self, texts, vectors, metadatas=None):
+        """Append already embedded chunks."""
+        if metadatas is None:
+            metadatas = [None] * len(texts)
+        vectors = _normalised(vectors)
+        with self.lock:
+            end = self._size + len(vectors)
+            if end > len(self._matrix):
+                matrix = np.empty((max(end, 2 * len(self._matrix)), self._matrix.shape[1]), dtype=np.float32)
+                matrix[:self._size] = self._matrix[:self._size]
+                self._matrix = matrix
+            self._matrix[self._size:end] = vectors
+            self.documents.extend(Document(page_content=text, metadata=metadata or {})
+                                  for text, metadata in zip(texts, metadatas))
+            self._size = end
+
+    def similarity_search_batch_with_score_by_vectors(self, vectors, k=4):
+        """(Document, score) lists of several query vectors, searched in one product."""
+        queries = _normalised(vectors)
+        with self.lock:
+            # Rows below _size are never written again, they can be read outside the lock
+            matrix = self._matrix[:self._size]
+            documents = self.documents[:self._size]
+        k = min(k, len(documents))
+        if k == 0:
+            return [[] for _ in queries]
+        scores = queries @ matrix.T
+        # Top k unordered in linear time, then only those k sorted
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [
+            [(documents[index], float(score)) for index, score in zip(row, row_scores)]
+            for row, row_scores in zip(top, top_scores)
+        ]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        return self.similarity_search_batch_with_score_by_vectors([embedding], k)[0]
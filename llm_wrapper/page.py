@@ -0,0 +1,116 @@
+#----------------------------------------------------------------------------------------------------
+"""What every page script does around its main(): logging, password, trace.
+
+A page script ends with `run_page(page_name, main)`. The name of the page
+running is kept for the script run, so the shared functions of llm_wrapper.qa
+and llm_wrapper.chat log under it ("[01_PDF-Loader-LLM][Prompt][ip]...") as the
+page scripts did.
+"""
+import contextvars
+import hmac
+import logging
+import os.path
+
+import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from llm_wrapper.answer import read_api_key
+from llm_wrapper.logs import setup_logging
+from llm_wrapper.prewarm import prewarm
+from llm_wrapper.tracing import span
+
+#-------------------------------------------------------------------
+secrets_file = ".streamlit/secrets.toml"
+
+_page = contextvars.ContextVar("llm_wrapper_page", default="llm_wrapper")
+
+#-------------------------------------------------------------------
+def current_page():
+    """Name of the page script running, for the log lines."""
+    return _page.get()
+
+#-------------------------------------------------------------------
+def get_remote_ip() -> str:
+    """Get remote ip."""
+    try:
+        ctx = get_script_run_ctx()
+        if ctx is None:
+            return None
+        session_info = runtime.get_instance().get_client(ctx.session_id)
+        if session_info is None:
+            return None
+    except Exception:
+        return "no_IP"
+    return session_info.request.remote_ip
+
+#-------------------------------------------------------------------
+def check_password():
+    """Returns `True` if the user had the correct password."""
+
+    def password_entered():
+        """Checks whether a password entered by the user is correct."""
+        if hmac.compare_digest(st.session_state["password"], st.secrets["password"]):
+            st.session_state["password_correct"] = True
+            del st.session_state["password"]  # Don't store the password.
+        else:
+            st.session_state["password_correct"] = False
+
+    # Return True if the password is validated.
+    if st.session_state.get("password_correct", False):
+        logging.info("["+current_page()+"][check_password]["+get_remote_ip()+"] logged")
+        return True
+
+    # Show input for password.
+    st.text_input(
+        "Password", type="password", on_change=password_entered, key="password"
+    )
+    if "password_correct" in st.session_state:
+        logging.warning("["+current_page()+"][check_password]["+get_remote_ip()+"] Password incorrect")
+        st.error("😕 Password incorrect")
+    return False
+
+#-------------------------------------------------------------------
+def get_file_contents(filename):
+    key = read_api_key(filename)
+    if key == "no_key":
+        logging.warning("["+current_page()+"][get_file_contents]["+get_remote_ip()+"] OpenAI API key not found - This API won't be available")
+    return key
+
+#-------------------------------------------------------------------
+def indexing(job, forget=None):
+    # Only wait for the first batch, the rest is indexed while the user asks questions
+    with st.spinner(text="Indexing content..."):
+        job.ready.wait()
+    if job.error is not None:
+        # A failed job must not stay cached: forget() drops it, the next run ingests again
+        if forget is not None:
+            forget()
+        st.error("Unable to index this content: "+str(job.error))
+        st.stop()
+    if not job.finished.is_set():
+        indexing_progress(job)
+    return job.knowledge_base
+
+@st.experimental_fragment(run_every=1)
+def indexing_progress(job):
+    if job.finished.is_set():
+        st.caption(f"Indexed {job.chunks_done} chunks")
+    else:
+        st.progress(job.progress, text=f"Indexing... {job.chunks_done} chunks ready, you can already ask questions")
+
+#-------------------------------------------------------------------
+def run_page(page_name, main):
+    """Run a page script: password check, then main() in a trace of the script run."""
+    setup_logging()
+    token = _page.set(page_name)
+    try:
+        # One trace per script run, the functions main() calls add their spans to it
+        with span(page_name, **{"client.address": get_remote_ip()}):
+            if os.path.isfile(secrets_file) and not check_password():
+                st.stop()  # Do not continue if check_password is not True.
+            main()
+    finally:
+        _page.reset(token)
+        # Once the page is shown, import what the other pages need while the user reads it
+        prewarm()
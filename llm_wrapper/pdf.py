@@ -0,0 +1,71 @@
+#----------------------------------------------------------------------------------------------------
+"""PDF text extraction fanned out page by page over a process pool."""
+import concurrent.futures
+import io
+import logging
+import multiprocessing
+import os
+import threading
+
+from PyPDF2 import PdfReader
+
+#-------------------------------------------------------------------
+max_workers = int(os.environ.get("PDF_WORKERS", os.cpu_count() or 1))
+# Below this many pages, shipping the file to the workers costs more than it saves
+min_pages_for_pool = int(os.environ.get("PDF_MIN_PAGES_FOR_POOL", "16"))
+
+_pool = None
+_lock = threading.Lock()
+
+#-------------------------------------------------------------------
+def get_pool():
+    """Return the process-wide extraction pool, started on first use."""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                # Spawned workers only import this module, never the Streamlit script
+                _pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _extract_range(data, start, stop):
+    reader = PdfReader(io.BytesIO(data))
+    return [reader.pages[number].extract_text() for number in range(start, stop)]
+
+#-------------------------------------------------------------------
+def count_pages(files):
+    """Total number of pages of the PDFs (given as bytes)."""
+    return sum(len(PdfReader(io.BytesIO(data)).pages) for data in files)
+
+def extract_pages(files):
+    """Yield the text of every page of every PDF (given as bytes), in order.
+
+    Large documents are split in page ranges extracted in parallel; results are
+    yielded as soon as the next range in order is ready.
+    """
+    readers = [PdfReader(io.BytesIO(data)) for data in files]
+    if max_workers < 2 or sum(len(reader.pages) for reader in readers) < min_pages_for_pool:
+        for reader in readers:
+            for page in reader.pages:
+                yield page.extract_text()
+        return
+
+    try:
+        pool = get_pool()
+        futures = []
+        for data, reader in zip(files, readers):
+            page_count = len(reader.pages)
+            # About two ranges per worker keeps the pool busy without copying the file too often
+            pages_per_task = max(1, -(-page_count // (max_workers * 2)))
+            for start in range(0, page_count, pages_per_task):
+                futures.append(pool.submit(_extract_range, data, start, min(start + pages_per_task, page_count)))
+    except Exception:
+        logging.warning("[llm_wrapper][pdf][extract_pages] process pool unavailable, extracting in-process", exc_info=True)
+        for reader in readers:
+            for page in reader.pages:
+                yield page.extract_text()
+        return
+
+    for future in futures:
+        yield from future.result()
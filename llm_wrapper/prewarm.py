@@ -0,0 +1,71 @@
+#----------------------------------------------------------------------------------------------------
+"""Background loading of the heavy dependencies, once per server process.
+
+The pages import only light modules before their first paint: LangChain, the
+OpenAI client, Qdrant, PyPDF2, httpx, youtube_transcript_api and the embeddings
+model are imported where they are first used. Once the first page run is over,
+this thread imports the rest and loads the embeddings model while the user
+reads the page, so the first upload or question usually finds them ready.
+It starts after the run rather than with it: imports are CPU bound, and two
+threads importing at once only slow the page down. Python's import lock makes
+a page needing a module the thread is importing simply wait for it, which is
+why the pages show their title and header before building their chains.
+"""
+import importlib
+import logging
+import os
+import threading
+
+from llm_wrapper.tracing import span
+
+#-------------------------------------------------------------------
+enabled = os.environ.get("PREWARM", "1") != "0"
+# Most needed first
+heavy_modules = [
+    "llm_wrapper.vectorstore",
+    "llm_wrapper.ingest",
+    "llm_wrapper.webui",
+    "langchain.chains.question_answering",
+    "langchain.chains.conversation.base",
+    "langchain_openai",
+    "llm_wrapper.memory",
+    "llm_wrapper.pdf",
+    "httpx",
+    "youtube_transcript_api",
+]
+
+done = threading.Event()
+_thread = None
+_lock = threading.Lock()
+
+#-------------------------------------------------------------------
+def prewarm():
+    """Start importing the heavy modules in a background thread, once per process."""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        if not enabled:
+            done.set()
+            return
+        _thread = threading.Thread(target=_prewarm, name="prewarm", daemon=True)
+        _thread.start()
+
+def _prewarm():
+    try:
+        with span("prewarm"):
+            for module in heavy_modules:
+                with span(module):
+                    try:
+                        importlib.import_module(module)
+                    except Exception:
+                        # The page using it reports the error when it imports it
+                        logging.warning("[llm_wrapper][prewarm] unable to import "+module, exc_info=True)
+            with span("tokenizer"):
+                from llm_wrapper.budget import count_tokens
+                count_tokens("warm up")
+    finally:
+        done.set()
+    # Last, the slowest: the sentence-transformer (torch) model, in its own thread
+    from llm_wrapper.embeddings import warm_up
+    warm_up()
@@ -0,0 +1,181 @@
+#----------------------------------------------------------------------------------------------------
+"""Questions over a knowledge base, one by one or in a batch, shared by the PDF, file, URL and YouTube pages.
+
+The chains are built once per server process; the functions render on the
+page running and log under its name (llm_wrapper.page.current_page()).
+"""
+import datetime
+import logging
+import time
+
+import streamlit as st
+
+from llm_wrapper.answer import apikeyfile, build_prompt, invoke_answer, qa_chains, stream_answer
+from llm_wrapper.backend import client
+from llm_wrapper.batch import answer_batch, max_questions, pool_size, read_questions, results_csv
+from llm_wrapper.page import current_page, get_file_contents, get_remote_ip
+from llm_wrapper.response_cache import store_response
+from llm_wrapper.retrieval import parse_brackets, retrieve
+from llm_wrapper.scheduler import SchedulerBusy, placeholder_feedback, requester
+from llm_wrapper.tracing import traced
+
+#-------------------------------------------------------------------
+@traced
+def prompting_llm(user_question,_knowledge_base,_chain,k_value,llm_used,retrieval=None,stream=False,use_cache=True):
+    page_name = current_page()
+    try:
+        # Local LLM calls queue behind other users, the placeholder shows the position while waiting
+        with st.spinner(text="Prompting LLM..."), requester(get_remote_ip(), placeholder_feedback(st.empty())):
+            prompt_brackets, user_question = parse_brackets(user_question)
+            if prompt_brackets != user_question:
+                logging.info("["+page_name+"][Prompt]["+get_remote_ip()+"]["+llm_used+"]: Searching only '"+prompt_brackets+"'")
+
+            # Reuse the chunks already retrieved for this question, search only when called without them
+            if retrieval is None:
+                retrieval = retrieve(_knowledge_base, prompt_brackets, k_value)
+            doc_to_prompt = retrieval.documents
+
+            logging.info("["+page_name+"][Prompt]["+get_remote_ip()+"]["+llm_used+"]: "+user_question)
+            for x in range(len(retrieval)):
+                try:
+                    content, score = retrieval.docs_stats[x]
+                    logging.info("["+page_name+"][Chunk]["+get_remote_ip()+"]["+str(x)+"]["+str(score)+"]: "+content.page_content.replace("\n","\\n"))
+                except:
+                    pass
+            # Keep the best chunks that fit in the model's context, leaving room for the answer
+            prompt = build_prompt(_chain, doc_to_prompt, user_question, use_cache)
+            budget = prompt.budget
+            doc_to_prompt = budget.documents
+            st.write(f"Prompt len: {budget.prompt_tokens} tokens")
+            if budget.dropped or budget.truncated:
+                logging.info("["+page_name+"][Prompt]["+get_remote_ip()+"]["+llm_used+"]: "+str(budget.dropped)+" chunks dropped, "+str(budget.truncated)+" truncated to fit "+str(budget.window)+" tokens")
+                st.caption(f"{budget.dropped} chunks left out and {budget.truncated} shortened to fit the {budget.window} tokens context")
+            if prompt.cached is not None:
+                response, tier = prompt.cached
+                logging.info("["+page_name+"][Response]["+get_remote_ip()+"]["+llm_used+"][cache:"+tier+"]: "+response.replace("\n","\\n").strip())
+                if stream:
+                    st.write(response.replace("\n","  \n"))
+                st.caption("Answer from the response cache")
+                return response
+            # Grab and print response
+            if stream:
+                # Render the tokens on the page while the LLM generates them
+                response = st.write_stream(stream_answer(_chain, doc_to_prompt, user_question))
+            else:
+                response = invoke_answer(_chain, doc_to_prompt, user_question)
+            logging.info("["+page_name+"][Response]["+get_remote_ip()+"]["+llm_used+"]: "+response.replace("\n","\\n").strip())
+            store_response(prompt.cache_key, response)
+            return response
+    except SchedulerBusy:
+        logging.warning("["+page_name+"][prompting_llm]["+get_remote_ip()+"]LLM queue is full")
+        st.warning("The LLM is busy with other users, please try again in a moment")
+        return "LLM busy"
+    except Exception:
+        # Not BaseException: Streamlit stops or reruns the script with exceptions raised from the elements, even mid-stream
+        logging.warning("["+page_name+"][prompting_llm]["+get_remote_ip()+"]LLM could not be contacted")
+        st.error("LLM could not be contacted")
+        return "No response from LLM"
+
+#-------------------------------------------------------------------
+@traced
+def retrieving_chunks(user_question,_knowledge_base,k_value):
+    prompt_brackets, user_question = parse_brackets(user_question)
+    return retrieve(_knowledge_base, prompt_brackets, k_value)
+
+#-------------------------------------------------------------------
+@traced
+def chunk_search(user_question,retrieval):
+    result = '  \n '+datetime.datetime.now().astimezone().isoformat()
+    result = result + "  \nPrompt: "+user_question+ "  \n"
+    for x in range(len(retrieval)):
+        try:
+            result = result + '  \n'+str(x)+' -------------------'
+            content, score = retrieval.docs_stats[x]
+            result = result + "  \nContent: "+content.page_content
+            # Chunks of a video link to their position in it
+            if content.metadata.get("source"):
+                result = result + "  \nSource: "+content.metadata["source"]
+            result = result + "  \n  \nScore: "+str(score)+"  \n"
+        except:
+            pass
+    return result
+
+#-------------------------------------------------------------------
+@traced
+def batch_questions(knowledge_base,chain,k_value,llm_used,prefix,use_cache=True):
+    page_name = current_page()
+    results_key = "batch_results_"+page_name
+    with st.expander("Batch questions"):
+        questions_text = st.text_area("Questions, one per line. You can use [] to narrow the dataset search.", key="batch_text")
+        questions_csv = st.file_uploader("...or a CSV file of questions (its \"question\" column, or the first one)", type=["csv"], key="batch_csv")
+        if st.button("Answer all the questions", key="batch_run"):
+            try:
+                questions, error = read_questions(questions_text, questions_csv.getvalue() if questions_csv else None), None
+            except ValueError as e:
+                questions, error = [], str(e)
+            if len(questions) > max_questions:
+                st.warning(f"Only the first {max_questions} questions are answered")
+                questions = questions[:max_questions]
+            if error:
+                st.warning(error)
+            elif not questions:
+                st.warning("No question to answer")
+            else:
+                results = []
+                progress = st.progress(0.0, text=f"0/{len(questions)} questions answered")
+                start_time = time.perf_counter()
+                # All the questions queue for the local LLM as this user (the workers cannot write on the page)
+                with requester(get_remote_ip()):
+                    for result in answer_batch(knowledge_base, chain, questions, k_value, prefix, use_cache, pool_size(llm_used)):
+                        results.append(result)
+                        logging.info("["+page_name+"][Batch]["+get_remote_ip()+"]["+llm_used+"]["+str(result.index)+"]: "+result.question)
+                        logging.info("["+page_name+"][Response]["+get_remote_ip()+"]["+llm_used+"]["+str(result.index)+"]: "+(result.error or result.answer).replace("\n","\\n").strip())
+                        progress.progress(len(results)/len(questions), text=f"{len(results)}/{len(questions)} questions answered")
+                st.session_state[results_key] = (sorted(results, key=lambda result: result.index), time.perf_counter() - start_time)
+        # Kept in the session: downloading the table reruns the page
+        if results_key in st.session_state:
+            results, seconds = st.session_state[results_key]
+            st.caption(f"{len(results)} questions answered in {seconds:.1f} s")
+            st.dataframe([result.row() for result in results], use_container_width=True)
+            st.download_button("Download the answers (CSV)", results_csv(results), file_name="answers.csv", mime="text/csv", key="batch_download")
+
+#-------------------------------------------------------------------
+@traced
+def commands(prompt,last_prompt,last_response,knowledge_base,chain,k_value,llm_used):
+    match prompt.split(" ")[0]:
+        case "/continue":
+            prompt = "Given this question: " + last_prompt.strip() + ", continue the following text you already started: " + last_response.rsplit("\n\n", 3)[0]
+            response = prompting_llm(prompt,knowledge_base,chain,k_value,llm_used).replace("\n","  \n")
+            return response
+
+        case "/model":
+            r = client.get('/v1/internal/model/info')
+            r.raise_for_status()
+            return "Loaded model:  \n" + r.json()["model_name"]
+
+        case "/recall":
+            return "Prompt: _"+last_prompt+"_  \n  \nResponse: "+last_response
+
+        case "/repeat":
+            prompt = "This is a document for reference, based on this text " + last_prompt.strip() + ":"
+            response = prompting_llm(prompt,knowledge_base,chain,k_value,llm_used,use_cache=False).replace("\n","  \n")
+            return response
+
+        case "/stop":
+            r = client.post('/v1/internal/stop-generation')
+            r.raise_for_status()
+            if r.status_code == 200:
+                return "Ok, generation stopped."
+            else:
+                return "Stop command failed. Sometimes the LLM API becomes busy while generating text..."
+
+        case "/help":
+            return "Comand list available: /continue, /model, /recall, /repeat, /stop, /help"
+
+#-------------------------------------------------------------------
+@st.cache_resource(show_spinner=False)
+def loading_chains():
+    # Built once per server process and shared by the pages: the question answering chains hold no per-user state
+    OPENAI_API_KEY = get_file_contents(apikeyfile)
+    chain_local, chain_openai = qa_chains(OPENAI_API_KEY)
+    return OPENAI_API_KEY, chain_local, chain_openai
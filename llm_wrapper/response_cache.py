@@ -0,0 +1,166 @@
+#----------------------------------------------------------------------------------------------------
+"""Cache of LLM answers for the loader pages, stored in SQLite.
+
+An answer is reused when the same model is asked the same question with the
+same prompt template and retrieved chunks (exact tier). When
+RESPONSE_CACHE_SIMILARITY is set (it is off by default: every lookup then
+embeds the question), a question whose embedding is at least that similar to
+an already answered one over the same chunks reuses its answer too (semantic
+tier). Entries expire after RESPONSE_CACHE_TTL seconds and the least
+recently used ones are evicted beyond RESPONSE_CACHE_ENTRIES.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+#-------------------------------------------------------------------
+cache_path = os.environ.get("RESPONSE_CACHE_PATH", "cache/responses.sqlite")
+cache_ttl = int(os.environ.get("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+cache_max_entries = int(os.environ.get("RESPONSE_CACHE_ENTRIES", "10000"))
+similarity_threshold = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", "0") or 0)
+
+#-------------------------------------------------------------------
+def _sha256(*parts):
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+def llm_identity(llm):
+    """The LLM class, its parameters and, for the local backend, the loaded model."""
+    from llm_wrapper.webui import model_info, webuiLLM
+
+    params = dict(llm._identifying_params)
+    params["max_tokens"] = getattr(llm, "max_tokens", None)
+    if isinstance(llm, webuiLLM):
+        params["model_name"] = model_info().get("model_name")
+    return type(llm).__name__ + json.dumps(params, sort_keys=True, default=str)
+
+class ResponseKey:
+    """Where an answer is stored: `scope` covers everything but the question."""
+
+    def __init__(self, llm, template, documents, question):
+        # Chunks are identified by their content, stable across rebuilds of the vector store
+        chunk_ids = [_sha256(doc.page_content) for doc in documents]
+        self.scope = _sha256(llm_identity(llm), template, *sorted(chunk_ids))
+        self.key = _sha256(self.scope, *chunk_ids, question)
+        self.question = question
+        self._vector = None
+
+    @property
+    def vector(self):
+        """Normalised question embedding, computed on first use."""
+        if self._vector is None:
+            from llm_wrapper.embeddings import get_embeddings
+
+            vector = np.asarray(get_embeddings().embed_query(self.question), dtype=np.float32)
+            self._vector = vector / (np.linalg.norm(vector) or 1.0)
+        return self._vector
+
+#-------------------------------------------------------------------
+class ResponseCache:
+    """Thread-safe ResponseKey → answer store."""
+
+    def __init__(self, path=cache_path, ttl=cache_ttl, max_entries=cache_max_entries, threshold=similarity_threshold):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, scope TEXT NOT NULL, vector BLOB, "
+                "response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            # Expired entries are deleted on every lookup
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+
+    def get(self, key):
+        """Return (answer, "exact" | "semantic"), or None."""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            row = self._connection.execute("SELECT key, response FROM responses WHERE key = ?", (key.key,)).fetchone()
+            if row is not None:
+                return self._accessed(row, now), "exact"
+        if not self.threshold:
+            return None
+        # Embedding the question may load the model: not while holding the lock
+        vector = key.vector
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                "SELECT key, response, vector FROM responses WHERE scope = ? AND vector IS NOT NULL", (key.scope,)).fetchall()
+            if not rows:
+                return None
+            similarities = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows]) @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            return self._accessed(rows[best], now), "semantic"
+
+    def _accessed(self, row, now):
+        self._connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, row[0]))
+        return row[1]
+
+    def put(self, key, response):
+        now = time.time()
+        # Computed before taking the lock, as in get
+        vector = key.vector.tobytes() if self.threshold else None
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, scope, vector, response, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key.key, key.scope, vector, response, now, now))
+            # Least recently used entries go first
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+
+#-------------------------------------------------------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the process-wide cache, or None when disabled (empty RESPONSE_CACHE_PATH) or unavailable."""
+    global _cache
+    if _cache is None and cache_path:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = ResponseCache(cache_path)
+                except (OSError, sqlite3.Error):
+                    logging.warning("[llm_wrapper][response_cache] unable to open "+cache_path, exc_info=True)
+                    return None
+    return _cache
+
+#-------------------------------------------------------------------
+def response_key(chain, documents, question):
+    """ResponseKey of a question answering chain call, or None when the cache is disabled."""
+    if get_cache() is None:
+        return None
+    return ResponseKey(chain.llm_chain.llm, chain.llm_chain.prompt.template, documents, question)
+
+def lookup_response(key):
+    """Cached (answer, tier) for the key, or None."""
+    if key is None:
+        return None
+    try:
+        return get_cache().get(key)
+    except Exception:
+        logging.warning("[llm_wrapper][response_cache] lookup failed", exc_info=True)
+        return None
+
+def store_response(key, response):
+    if key is None or not response.strip():
+        return
+    try:
+        get_cache().put(key, response)
+    except Exception:
+        logging.warning("[llm_wrapper][response_cache] store failed", exc_info=True)
@@ -0,0 +1,60 @@
+#----------------------------------------------------------------------------------------------------
+"""Knowledge base retrieval shared by the loader pages."""
+import re
+
+from llm_wrapper.tracing import span
+
+#-------------------------------------------------------------------
+brackets = re.compile(r'\[(.*)\]')
+
+def parse_brackets(user_question):
+    """Split a question into (search query, question sent to the LLM).
+
+    Text inside [] narrows the dataset search; the brackets are removed from the
+    question itself.
+    """
+    match = brackets.search(user_question)
+    if match is None:
+        return user_question, user_question
+    search_query = match.group(0).replace('[','').replace(']','')
+    return search_query, user_question.replace('[','').replace(']','')
+
+#-------------------------------------------------------------------
+class RetrievalResult:
+    """Chunks retrieved for one query, with their similarity scores."""
+
+    def __init__(self, query, docs_stats):
+        self.query = query
+        self.docs_stats = docs_stats
+
+    @property
+    def documents(self):
+        return [doc for doc, score in self.docs_stats]
+
+    @property
+    def scores(self):
+        return [score for doc, score in self.docs_stats]
+
+    def __len__(self):
+        return len(self.docs_stats)
+
+#-------------------------------------------------------------------
+def retrieve(knowledge_base, query, k_value):
+    """Embed the query and search the knowledge base once."""
+    with span("retrieve", k=k_value):
+        with span("embed"):
+            vector = knowledge_base.embeddings.embed_query(query)
+        with span("search") as search:
+            docs_stats = knowledge_base.similarity_search_with_score_by_vector(vector, k=k_value)
+            search.set("results", len(docs_stats))
+    return RetrievalResult(query, docs_stats)
+
+def retrieve_batch(knowledge_base, queries, k_value):
+    """Embed the queries in one encoder call and search them in one batch."""
+    with span("retrieve_batch", k=k_value, queries=len(queries)):
+        with span("embed"):
+            vectors = knowledge_base.embeddings.embed_queries(queries)
+        with span("search") as search:
+            results = knowledge_base.similarity_search_batch_with_score_by_vectors(vectors, k=k_value)
+            search.set("results", sum(len(docs_stats) for docs_stats in results))
+    return [RetrievalResult(query, docs_stats) for query, docs_stats in zip(queries, results)]
@@ -0,0 +1,155 @@
+#----------------------------------------------------------------------------------------------------
+"""Request queue in front of the local LLM backend.
+
+text-generation-webui generates one completion at a time. Every webuiLLM call
+takes a slot here first: waiting requests are bounded, served round-robin
+between users so one user cannot starve the others, and report their queue
+position while they wait.
+"""
+import collections
+import contextlib
+import contextvars
+import os
+import threading
+
+#-------------------------------------------------------------------
+concurrency = int(os.environ.get("LLM_CONCURRENCY", "1"))
+max_waiting = int(os.environ.get("LLM_QUEUE_SIZE", "16"))
+max_waiting_per_user = int(os.environ.get("LLM_QUEUE_PER_USER", "2"))
+
+#-------------------------------------------------------------------
+class SchedulerBusy(Exception):
+    """Raised when the queue (or the user's share of it) is full."""
+
+class Ticket:
+    def __init__(self, user):
+        self.user = user
+        self.granted = False
+
+#-------------------------------------------------------------------
+class Scheduler:
+    def __init__(self, concurrency=concurrency, max_waiting=max_waiting, max_waiting_per_user=max_waiting_per_user):
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.max_waiting_per_user = max_waiting_per_user
+        self.running = 0
+        # user -> waiting tickets; the order of the users is the round-robin order
+        self._queues = collections.OrderedDict()
+        self._condition = threading.Condition()
+
+    @property
+    def waiting(self):
+        with self._condition:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def submit(self, user):
+        """Queue a request for `user`, or raise SchedulerBusy."""
+        with self._condition:
+            queue = self._queues.get(user, ())
+            if sum(len(q) for q in self._queues.values()) >= self.max_waiting or len(queue) >= self.max_waiting_per_user:
+                raise SchedulerBusy("The LLM is busy, please try again in a moment")
+            ticket = Ticket(user)
+            self._queues.setdefault(user, collections.deque()).append(ticket)
+            self._dispatch()
+            return ticket
+
+    def position(self, ticket):
+        """1-based position of a waiting ticket in the round-robin serving order."""
+        with self._condition:
+            queue = self._queues.get(ticket.user)
+            if ticket.granted or queue is None or ticket not in queue:
+                return 0
+            index = queue.index(ticket)
+            # Round r serves the r-th ticket of every user, in user order
+            position = 1
+            before = True
+            for user, other in self._queues.items():
+                if user == ticket.user:
+                    before = False
+                position += min(len(other), index)
+                if before and len(other) > index:
+                    position += 1
+            return position
+
+    def wait(self, ticket, timeout=None):
+        """Block until the ticket is granted or the timeout expires."""
+        with self._condition:
+            return self._condition.wait_for(lambda: ticket.granted, timeout)
+
+    def release(self, ticket):
+        """Give back the slot of a granted ticket, or leave the queue."""
+        with self._condition:
+            if ticket.granted:
+                ticket.granted = False
+                self.running -= 1
+            else:
+                queue = self._queues.get(ticket.user)
+                if queue is not None and ticket in queue:
+                    queue.remove(ticket)
+                    if not queue:
+                        del self._queues[ticket.user]
+            self._dispatch()
+
+    def _dispatch(self):
+        while self.running < self.concurrency and self._queues:
+            user, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            # The user goes to the back of the rotation
+            del self._queues[user]
+            if queue:
+                self._queues[user] = queue
+            ticket.granted = True
+            self.running += 1
+        self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, user, on_wait=None):
+        """Hold one backend slot for the duration of the block.
+
+        `on_wait(position)` is called about twice a second while waiting, and
+        `on_wait(None)` once the slot is granted. Leaving the block for any
+        reason, including the user abandoning the page, frees the slot.
+        """
+        ticket = self.submit(user)
+        try:
+            while not self.wait(ticket, 0.5):
+                if on_wait is not None:
+                    on_wait(self.position(ticket))
+            if on_wait is not None:
+                on_wait(None)
+            yield ticket
+        finally:
+            self.release(ticket)
+
+#-------------------------------------------------------------------
+scheduler = Scheduler()
+
+# Who is asking, set by the pages around their LLM calls; background work falls in its own lane
+_requester = contextvars.ContextVar("llm_wrapper_requester", default=("background", None))
+
+@contextlib.contextmanager
+def requester(user, on_wait=None):
+    """Attribute the LLM calls made inside the block to `user`."""
+    token = _requester.set((user, on_wait))
+    try:
+        yield
+    finally:
+        _requester.reset(token)
+
+def current_requester():
+    return _requester.get()
+
+#-------------------------------------------------------------------
+def placeholder_feedback(placeholder):
+    """on_wait callback writing the queue position into a Streamlit placeholder.
+
+    When the user leaves or reruns the page, the update raises Streamlit's stop
+    or rerun exception: it must reach Streamlit, Scheduler.slot leaves the queue
+    on the way out. Callers catch Exception only (llm_wrapper.qa, llm_wrapper.chat).
+    """
+    def on_wait(position):
+        if position is None:
+            placeholder.empty()
+        else:
+            placeholder.info(f"The LLM is answering other users, your request is number {position} in the queue")
+    return on_wait
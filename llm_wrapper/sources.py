@@ -0,0 +1,115 @@
+#----------------------------------------------------------------------------------------------------
+"""From the loaders' inputs (files, Wikipedia, URLs, YouTube videos) to ingest jobs.
+
+Shared by the loader pages and the API. A *_source function reads its input
+into a Source, then ingest() reopens the stored knowledge base of that content
+and chunking, or starts indexing it in the background. Inputs that could not be
+read (a URL, a video) are listed in Source.errors for the caller to report.
+"""
+import logging
+import os
+
+from llm_wrapper.fetch import fetch_urls, wikipedia_summaries
+from llm_wrapper.html_text import extract_text
+from llm_wrapper.stages import cached_chunker, cached_document, cached_segments
+
+#-------------------------------------------------------------------
+# In-memory index ticked by default in the advanced options: "qdrant" or "numpy"
+index_backend = os.environ.get("VECTOR_INDEX", "qdrant")
+
+#-------------------------------------------------------------------
+class Source:
+    """Content to index: its hash, and how to read it when it is not indexed yet.
+
+    `read()` returns (segments, number of segments); `chunker` is the
+    IngestJob chunker, `errors` (input, exception) pairs.
+    """
+
+    def __init__(self, source_hash, read, chunker=None, errors=()):
+        self.source_hash = source_hash
+        self.read = read
+        self.chunker = chunker or cached_chunker(source_hash)
+        self.errors = list(errors)
+
+#-------------------------------------------------------------------
+def pdf_source(files):
+    """PDF files given as bytes."""
+    from llm_wrapper.pdf import count_pages, extract_pages
+    from llm_wrapper.vectorstore import content_hash
+
+    source_hash = content_hash(*files)
+    # Extract the pages in parallel, as the ingest needs them.
+    # Pages and chunks are cached apart from the chunking: a new chunking does not parse the files again
+    return Source(source_hash, lambda: (cached_segments(source_hash, lambda: extract_pages(files)), count_pages(files)))
+
+def text_source(files):
+    """Plain-text files given as bytes, passed as-is, one file at a time."""
+    from llm_wrapper.vectorstore import content_hash
+
+    return Source(content_hash(*files), lambda: ((content.decode("utf-8") for content in files), len(files)))
+
+def wikipedia_source(topic):
+    """Summaries of the Wikipedia articles found for the topic."""
+    from llm_wrapper.vectorstore import content_hash
+
+    text = wikipedia_summaries(topic)
+    return Source(content_hash(text), lambda: ([text], 1))
+
+def url_source(urls):
+    """Main content of web pages, or the text of other documents."""
+    from llm_wrapper.vectorstore import content_hash
+
+    # All the URLs are fetched at once, through the shared HTTP cache
+    texts = []
+    errors = []
+    for url, page in zip(urls, fetch_urls(urls)):
+        if isinstance(page, Exception):
+            errors.append((url, page))
+            continue
+        logging.info("[llm_wrapper][sources]["+url+"] "+str(len(page.body))+" bytes"+(" from cache" if page.from_cache else ""))
+        # Main content only: menus, scripts and footers would be chunked and embedded too.
+        # The extracted text is cached by page content, a new chunking does not parse the page again
+        if "html" in page.content_type or not page.content_type:
+            texts.append(cached_document(content_hash(page.body), lambda: extract_text(page.text)))
+        else:
+            texts.append(page.text)
+    return Source(content_hash(*texts), lambda: (texts, len(texts)), errors=errors)
+
+def youtube_source(video_ids):
+    """Transcripts of YouTube videos, keeping the video positions of the chunks."""
+    from llm_wrapper.vectorstore import content_hash
+    from llm_wrapper.youtube import fetch_transcripts, iter_transcript_chunks
+
+    # Raw transcripts are cached per video, changing the chunking does not fetch them again
+    transcripts = []
+    errors = []
+    for video_id, transcript in zip(video_ids, fetch_transcripts(video_ids)):
+        if isinstance(transcript, Exception):
+            errors.append((video_id, transcript))
+        else:
+            transcripts.append(transcript)
+    source_hash = content_hash(*(t.video_id + "\n" + t.text for t in transcripts))
+    return Source(source_hash, lambda: (transcripts, len(transcripts)), cached_chunker(source_hash, iter_transcript_chunks), errors)
+
+#-------------------------------------------------------------------
+def ingest(source, chunk_size, chunk_overlap, persist=False, backend=index_backend):
+    """IngestJob of the source: the stored knowledge base when already embedded, else a new background ingest.
+
+    `backend` only applies in memory, knowledge bases kept on disk are Qdrant collections.
+    """
+    from llm_wrapper.ingest import IngestJob, start_ingest
+    from llm_wrapper.vectorstore import VectorStoreLocked, collection_name, open_knowledge_base
+
+    # Reopen the stored vector store when this exact content was already embedded
+    name = collection_name(source.source_hash, chunk_size, chunk_overlap) if persist else None
+    try:
+        knowledge_base = open_knowledge_base(name)
+    except VectorStoreLocked as e:
+        return IngestJob.from_error(e)
+    if knowledge_base is not None:
+        return IngestJob.from_knowledge_base(knowledge_base)
+
+    # Chunk, embed and index in the background, the first batch is searchable before the rest is read
+    segments, total_segments = source.read()
+    return start_ingest(segments, chunk_size, chunk_overlap, name, total_segments=total_segments, chunker=source.chunker,
+                        backend=backend)
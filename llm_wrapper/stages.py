@@ -0,0 +1,123 @@
+#----------------------------------------------------------------------------------------------------
+"""Staged caching of the ingest pipeline.
+
+Each stage is cached on what it depends on, so a new chunk size only re-chunks
+the already parsed text and re-embeds the chunks that changed:
+
+    parsed text   by source hash                       (documents)
+    chunks        by source hash, chunker and params   (chunk_lists)
+    embeddings    by chunk hash                        (llm_wrapper.embedding_cache)
+
+The first two stages are filled while the ingest streams through them, so the
+first batch is still searchable before the whole document is parsed. They are
+bounded by the length of the text they hold (DOCUMENT_CACHE_BYTES,
+CHUNK_CACHE_BYTES): a document larger than that is not collected, its ingest
+keeps memory bounded by the batch size and a new chunking parses it again. The pages
+keep the resulting knowledge bases with st.cache_resource, sized by the
+knowledge_base_cache_* settings below.
+"""
+import collections
+import os
+import threading
+import time
+
+#-------------------------------------------------------------------
+stage_cache_ttl = int(os.environ.get("STAGE_CACHE_TTL", "3600"))
+# Knowledge bases kept alive by the pages, shared by reference across sessions
+knowledge_base_cache_entries = int(os.environ.get("KNOWLEDGE_BASE_CACHE_ENTRIES", "16"))
+knowledge_base_cache_ttl = float(os.environ.get("KNOWLEDGE_BASE_CACHE_TTL", "3600"))
+
+class StageCache:
+    """Thread-safe in-memory LRU cache whose entries expire after `ttl` seconds.
+
+    With `max_size`, the sizes given to put() add up to at most that much: the
+    least recently used entries are evicted, and a larger value is not kept.
+    """
+
+    def __init__(self, max_entries, ttl=stage_cache_ttl, max_size=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key, value, size=0):
+        with self._lock:
+            if key in self._items:
+                self._size -= self._items.pop(key)[2]
+            if self.max_size is not None and size > self.max_size:
+                return
+            self._items[key] = (time.monotonic(), value, size)
+            self._size += size
+            while len(self._items) > self.max_entries or (self.max_size is not None and self._size > self.max_size):
+                self._size -= self._items.popitem(last=False)[1][2]
+
+documents = StageCache(int(os.environ.get("DOCUMENT_CACHE_ENTRIES", "32")),
+                       max_size=int(os.environ.get("DOCUMENT_CACHE_BYTES", str(64 * 1024 * 1024))))
+chunk_lists = StageCache(int(os.environ.get("CHUNK_CACHE_ENTRIES", "64")),
+                         max_size=int(os.environ.get("CHUNK_CACHE_BYTES", str(64 * 1024 * 1024))))
+
+#-------------------------------------------------------------------
+def _text_size(item):
+    # Segments and chunks are strings, or (text, metadata) pairs
+    return len(item if isinstance(item, str) else item[0])
+
+def _tee(cache, key, items):
+    """Yield the items, and cache them once they have all been consumed.
+
+    They are no longer collected once they are larger than the cache.
+    """
+    done = []
+    size = 0
+    for item in items:
+        if done is not None:
+            size += _text_size(item)
+            if cache.max_size is not None and size > cache.max_size:
+                done = None
+            else:
+                done.append(item)
+        yield item
+    if done is not None:
+        cache.put(key, done, size)
+
+def cached_document(source_hash, parse):
+    """Parsed text of a source: from the cache, or `parse()` cached."""
+    text = documents.get(source_hash)
+    if text is None:
+        text = parse()
+        documents.put(source_hash, text, len(text))
+    return text
+
+def cached_segments(source_hash, extract):
+    """Parsed segments of a source: from the cache, or from `extract()` while caching them."""
+    segments = documents.get(source_hash)
+    if segments is not None:
+        return iter(segments)
+    return _tee(documents, source_hash, extract())
+
+def cached_chunker(source_hash, chunker=None):
+    """IngestJob chunker reusing the chunks of a source already split with the same parameters.
+
+    `chunker` defaults to llm_wrapper.ingest.iter_chunks.
+    """
+    if chunker is None:
+        # Not imported at the top: this module is loaded by the pages before their first paint
+        from llm_wrapper.ingest import iter_chunks as chunker
+
+    def chunk(segments, chunk_size, chunk_overlap):
+        key = (source_hash, chunker.__module__ + "." + chunker.__name__, chunk_size, chunk_overlap)
+        chunks = chunk_lists.get(key)
+        if chunks is not None:
+            # The segments are not needed, a lazy extraction is never started
+            return iter(chunks)
+        return _tee(chunk_lists, key, chunker(segments, chunk_size, chunk_overlap))
+    return chunk
@@ -0,0 +1,217 @@
+#----------------------------------------------------------------------------------------------------
+"""Span based tracing of the page runs and of the work they trigger.
+
+A span times one step with `time.perf_counter_ns()`. Spans opened while
+another one is active (in the same thread or asyncio task) become its children,
+so one page run gives a tree such as
+
+    01_PDF-Loader-LLM
+      prompting_llm
+        retrieve
+          embed
+          search
+        prompt_build
+        generate
+
+Background work (ingest batches, memory summaries) starts its own traces.
+When the outermost span of a trace ends, the whole tree is logged on one line
+and appended to TRACE_PATH (default logs/traces.jsonl, empty to disable) with
+the OpenTelemetry span fields (traceId, spanId, parentSpanId,
+startTimeUnixNano...): one span per line, or with TRACE_FORMAT=otlp one OTLP/JSON
+export request per trace, the format the OpenTelemetry Collector file receiver
+reads.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+#-------------------------------------------------------------------
+trace_path = os.environ.get("TRACE_PATH", "logs/traces.jsonl")
+trace_format = os.environ.get("TRACE_FORMAT", "jsonl")
+service_name = os.environ.get("TRACE_SERVICE_NAME", "llm_wrapper")
+
+_current = contextvars.ContextVar("llm_wrapper_span", default=None)
+
+#-------------------------------------------------------------------
+class Span:
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.root = parent.root if parent is not None else self
+        self.trace_id = self.root.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.children = []
+        self.status = "ok"
+        # Monotonic clock for the durations, converted to wall clock for the export from the root's start only
+        self.start_ns = time.perf_counter_ns()
+        self.start_unix_ns = time.time_ns() if parent is None else self.root._unix_ns(self.start_ns)
+        self.end_ns = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def event(self, name, **attributes):
+        """Mark a point in time inside the span (first token, slot granted...)."""
+        self.events.append((name, time.perf_counter_ns(), attributes))
+
+    def _end_ns(self):
+        # A span still open when its trace ends (an abandoned stream) is cut at that time
+        return self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+
+    @property
+    def duration_ms(self):
+        return (self._end_ns() - self.start_ns) / 1e6
+
+    def iter_spans(self, depth=0):
+        yield depth, self
+        for child in self.children:
+            yield from child.iter_spans(depth + 1)
+
+    def _unix_ns(self, perf_ns):
+        return self.root.start_unix_ns + perf_ns - self.root.start_ns
+
+    def to_dict(self):
+        """The span with the OpenTelemetry field names."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent.span_id if self.parent is not None else "",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_unix_ns),
+            "endTimeUnixNano": str(self._unix_ns(self._end_ns())),
+            "attributes": _otlp_attributes(self.attributes),
+            "events": [{"name": name, "timeUnixNano": str(self._unix_ns(perf_ns)), "attributes": _otlp_attributes(attributes)}
+                       for name, perf_ns, attributes in self.events],
+            "status": {"code": 2 if self.status == "error" else 1, "message": "" if self.status in ("ok", "error") else self.status},
+        }
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+#-------------------------------------------------------------------
+class _Exporter:
+    """Appends finished traces to the trace file, one write per trace."""
+
+    def __init__(self, path, format):
+        self.path = path
+        self.format = format
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _lines(self, root):
+        spans = [span.to_dict() for _, span in root.iter_spans()]
+        if self.format == "otlp":
+            return [{"resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+                "scopeSpans": [{"scope": {"name": "llm_wrapper.tracing"}, "spans": spans}],
+            }]}]
+        return spans
+
+    def export(self, root):
+        text = "".join(json.dumps(line) + "\n" for line in self._lines(root))
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(text)
+            self._file.flush()
+
+_exporter = _Exporter(trace_path, trace_format) if trace_path else None
+
+def _summary(root):
+    """One line view of a trace: name and duration of every span, children in parentheses.
+
+    Repeated siblings (the batches of an ingest) are summed up as "name Nx total".
+    """
+    def describe(span):
+        text = "{} {:.1f} ms".format(span.name, span.duration_ms)
+        if span.status != "ok":
+            text += " [" + span.status + "]"
+        if span.children:
+            text += " (" + ", ".join(describe_group(group) for group in group_children(span)) + ")"
+        return text
+
+    def describe_group(group):
+        if len(group) == 1:
+            return describe(group[0])
+        return "{} {}x {:.1f} ms".format(group[0].name, len(group), sum(span.duration_ms for span in group))
+
+    def group_children(span):
+        groups = {}
+        for child in span.children:
+            groups.setdefault(child.name, []).append(child)
+        return groups.values()
+
+    return describe(root)
+
+def _finish(root):
+    logging.info("[llm_wrapper][trace][" + str(root.attributes.get("client.address") or "background") + "] " + _summary(root))
+    if _exporter is not None:
+        try:
+            _exporter.export(root)
+        except OSError:
+            logging.warning("[llm_wrapper][trace] unable to write "+_exporter.path, exc_info=True)
+
+#-------------------------------------------------------------------
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time the block as a span, child of the active one; yields the Span."""
+    parent = _current.get()
+    current = Span(name, parent, attributes)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.status = "error"
+        current.set("exception.type", type(e).__name__)
+        raise
+    except BaseException as e:
+        # Streamlit stops and reruns the script with exceptions, and generators are closed with one
+        current.status = type(e).__name__
+        raise
+    finally:
+        current.end_ns = time.perf_counter_ns()
+        try:
+            _current.reset(token)
+        except ValueError:
+            # A generator closed from another context than the one it started in
+            pass
+        if parent is None:
+            _finish(current)
+
+def traced(func=None, *, name=None):
+    """Decorator running the function in a span named after it."""
+    if func is None:
+        return functools.partial(traced, name=name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(name or func.__name__):
+            return func(*args, **kwargs)
+    if hasattr(func, "clear"):
+        # Functions cached by Streamlit keep their clear()
+        wrapper.clear = func.clear
+    return wrapper
+
+def current_span():
+    """The active span, or None outside any trace."""
+    return _current.get()
@@ -0,0 +1,182 @@
+#----------------------------------------------------------------------------------------------------
+"""Knowledge base construction, in memory or persisted on disk.
+
+Persistent knowledge bases live in a local Qdrant folder (no server needed) and
+are named after a hash of the source content, the chunking parameters and the
+embeddings model, so a known document is reopened instead of re-embedded. In
+memory, the "numpy" backend (llm_wrapper.numpy_index) replaces the Qdrant client.
+"""
+import hashlib
+import logging
+import os
+import threading
+import uuid
+
+from langchain_community.vectorstores import Qdrant
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from llm_wrapper import embeddings
+from llm_wrapper.numpy_index import NumpyKnowledgeBase
+
+#-------------------------------------------------------------------
+persist_path = os.environ.get("QDRANT_PATH", "vectorstore")
+
+_client = None
+_lock = threading.RLock()
+
+#-------------------------------------------------------------------
+class VectorStoreLocked(RuntimeError):
+    """The vector store folder is open in another process: local Qdrant locks it for one client."""
+
+#-------------------------------------------------------------------
+def content_hash(*parts):
+    """Hash raw bytes or text of one or more sources."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+def collection_name(source_hash, chunk_size, chunk_overlap):
+    """Name of the persistent collection for a source chunked and embedded a given way."""
+    key = "{}:{}:{}:{}".format(source_hash, chunk_size, chunk_overlap, embeddings.model_name)
+    return "doc_" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+#-------------------------------------------------------------------
+def get_client():
+    """Return the process-wide local Qdrant client, opening the folder on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                try:
+                    client = QdrantClient(path=persist_path)
+                except RuntimeError as e:
+                    if "already accessed" not in str(e):
+                        raise
+                    raise VectorStoreLocked("The vector store folder '"+persist_path+"' is open in another process. "
+                                            "Run the pages and the API in one process (start_api.sh), "
+                                            "or give each its own QDRANT_PATH") from e
+                _drop_unfinished_collections(client)
+                _client = client
+    return _client
+
+def _drop_unfinished_collections(client):
+    # Finished builds are published under an alias, anything else was interrupted
+    published = {alias.collection_name for alias in client.get_aliases().aliases}
+    for collection in client.get_collections().collections:
+        if collection.name not in published:
+            logging.info("[llm_wrapper][vectorstore] dropping unfinished collection "+collection.name)
+            client.delete_collection(collection.name)
+
+#-------------------------------------------------------------------
+class KnowledgeBase(Qdrant):
+    """Qdrant vector store that can be searched while chunks are still being added."""
+
+    def __init__(self, *args, lock=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = lock if lock is not None else threading.RLock()
+
+    def similarity_search_with_score_by_vector(self, *args, **kwargs):
+        with self.lock:
+            return super().similarity_search_with_score_by_vector(*args, **kwargs)
+
+    def similarity_search_batch_with_score_by_vectors(self, vectors, k=4):
+        """(Document, score) lists of several query vectors, searched in one call."""
+        requests = [models.SearchRequest(vector=list(vector), limit=k, with_payload=True, with_vector=False)
+                    for vector in vectors]
+        with self.lock:
+            results = self.client.search_batch(self.collection_name, requests=requests)
+        return [
+            [(self._document_from_scored_point(point, self.collection_name, self.content_payload_key,
+                                               self.metadata_payload_key), point.score) for point in points]
+            for points in results
+        ]
+
+class PersistentKnowledgeBase(KnowledgeBase):
+    """Knowledge base stored on disk, pickled by name so caches never copy the client."""
+
+    def __init__(self, *args, **kwargs):
+        # Every persistent collection shares the one local client and its storage
+        super().__init__(*args, lock=_lock, **kwargs)
+
+    def __reduce__(self):
+        return (open_knowledge_base, (self.collection_name,))
+
+def open_knowledge_base(name):
+    """Return the persisted knowledge base called `name`, or None if it was never built."""
+    if name is None:
+        return None
+    client = get_client()
+    with _lock:
+        if name not in {alias.alias_name for alias in client.get_aliases().aliases}:
+            return None
+    return PersistentKnowledgeBase(client=client, collection_name=name, embeddings=embeddings.get_embeddings())
+
+#-------------------------------------------------------------------
+def new_knowledge_base(vector_size, name=None, backend="qdrant"):
+    """Create an empty knowledge base.
+
+    Without a name it lives in memory, in a Qdrant collection or with `backend`
+    "numpy" a NumPy matrix; with a name it is a persistent Qdrant collection
+    that becomes reachable by that name once `publish_knowledge_base` is called.
+    """
+    if name is None and backend == "numpy":
+        return NumpyKnowledgeBase(embeddings.get_embeddings(), vector_size)
+    if name is None:
+        client = QdrantClient(location=":memory:")
+        knowledge_base = KnowledgeBase(client=client, collection_name="doc_chunks", embeddings=embeddings.get_embeddings())
+    else:
+        client = get_client()
+        knowledge_base = PersistentKnowledgeBase(client=client, collection_name=name + "_" + uuid.uuid4().hex[:8],
+                                                 embeddings=embeddings.get_embeddings())
+    with knowledge_base.lock:
+        client.create_collection(
+            knowledge_base.collection_name,
+            vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE),
+        )
+    return knowledge_base
+
+def add_chunks(knowledge_base, chunks, vectors, metadatas=None):
+    """Upsert already embedded chunks."""
+    if isinstance(knowledge_base, NumpyKnowledgeBase):
+        knowledge_base.add(chunks, vectors, metadatas)
+        return
+    if metadatas is None:
+        metadatas = [None] * len(chunks)
+    points = [
+        models.PointStruct(
+            id=uuid.uuid4().hex,
+            vector=vector,
+            payload={Qdrant.CONTENT_KEY: chunk, Qdrant.METADATA_KEY: metadata},
+        )
+        for chunk, vector, metadata in zip(chunks, vectors, metadatas)
+    ]
+    with knowledge_base.lock:
+        knowledge_base.client.upsert(knowledge_base.collection_name, points=points)
+
+def publish_knowledge_base(knowledge_base, name):
+    """Make a fully indexed persistent knowledge base reachable by its name."""
+    client = knowledge_base.client
+    with _lock:
+        if name in {alias.alias_name for alias in client.get_aliases().aliases}:
+            # Another session finished the same content first
+            client.delete_collection(knowledge_base.collection_name)
+        else:
+            client.update_collection_aliases(change_aliases_operations=[
+                models.CreateAliasOperation(create_alias=models.CreateAlias(
+                    collection_name=knowledge_base.collection_name, alias_name=name))
+            ])
+    return PersistentKnowledgeBase(client=client, collection_name=name, embeddings=embeddings.get_embeddings())
+
+#-------------------------------------------------------------------
+def build_knowledge_base(chunks, name=None, backend="qdrant"):
+    """Embed all the chunks at once into a new knowledge base."""
+    vectors = embeddings.get_embeddings().embed_documents(chunks)
+    knowledge_base = new_knowledge_base(len(vectors[0]), name, backend)
+    add_chunks(knowledge_base, chunks, vectors)
+    if name is None:
+        return knowledge_base
+    return publish_knowledge_base(knowledge_base, name)
@@ -0,0 +1,159 @@
+#----------------------------------------------------------------------------------------------------
+"""LangChain LLM talking to the text-generation-webui OpenAI-compatible API."""
+import json
+import threading
+import time
+from typing import Any, Iterator, List, Mapping, Optional
+
+from langchain.llms.base import LLM
+from langchain_core.outputs import GenerationChunk
+
+from llm_wrapper.backend import client, connect_timeout, info_timeout, load_timeout
+from llm_wrapper.scheduler import current_requester, scheduler
+from llm_wrapper.tracing import span
+
+#-------------------------------------------------------------------
+class webuiLLM(LLM):
+    max_tokens: int = 1024
+
+    @property
+    def _llm_type(self) -> str:
+        return "custom"
+
+    def _payload(self, prompt: str, stream: bool = False) -> dict:
+        return {
+            "prompt": prompt,
+            "max_tokens": self.max_tokens,
+            "do_sample": "false",
+            "temperature": 0.7,
+            "top_p": 0.1,
+            "typical_p": 1,
+            "repetition_penalty": 1.18,
+            "top_k": 40,
+            "min_length": 0,
+            "no_repeat_ngram_size": 0,
+            "num_beams": 1,
+            "penalty_alpha": 0,
+            "seed": -1,
+            "add_bos_token": "true",
+            "ban_eos_token": "false",
+            "skip_special_tokens": "false",
+            "stop": ["Human: ","<|eot_id|>","<|end_of_text|>","Note: "],
+            "stream": stream,
+        }
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
+        with span("generate", stream=False, max_tokens=self.max_tokens) as generate:
+            with scheduler.slot(*current_requester()):
+                generate.event("slot_granted")
+                response = client.post("/v1/completions", json=self._payload(prompt))
+
+            response.raise_for_status()
+
+            return response.json()["choices"][0]["text"].strip().replace("```", " ")
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        """Yield the completion token by token from the server-sent events stream."""
+        with span("generate", stream=True, max_tokens=self.max_tokens) as generate, scheduler.slot(*current_requester()):
+            generate.event("slot_granted")
+            finished = False
+            tokens = 0
+            try:
+                with client.post("/v1/completions", json=self._payload(prompt, stream=True), stream=True) as response:
+                    response.raise_for_status()
+                    started = False
+                    for line in response.iter_lines(decode_unicode=True):
+                        # Events look like "data: {...}", anything else is a keep-alive or a comment
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        text = json.loads(data)["choices"][0]["text"].replace("```", " ")
+                        if not started:
+                            # Same leading whitespace handling as the blocking call
+                            text = text.lstrip()
+                            if not text:
+                                continue
+                            started = True
+                            generate.event("first_token")
+                        chunk = GenerationChunk(text=text)
+                        if run_manager:
+                            run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                        tokens += 1
+                        yield chunk
+                finished = True
+            finally:
+                generate.set("tokens", tokens)
+                if not finished:
+                    # The reader went away (or failed) mid-answer: free the backend for the next user
+                    stop_generation()
+
+    @property
+    def _identifying_params(self) -> Mapping[str, Any]:
+        """Get the identifying parameters."""
+        return {
+
+        }
+
+#-------------------------------------------------------------------
+def stop_generation():
+    """Ask the backend to abort the completion it is generating."""
+    try:
+        client.post("/v1/internal/stop-generation")
+    except:
+        pass
+
+#-------------------------------------------------------------------
+model_info_ttl = 10
+_model_info = (0.0, {})
+_model_info_generation = 0
+_model_info_lock = threading.Lock()
+
+def model_info():
+    """/v1/internal/model/info of the backend, remembered for a few seconds ({} when unreachable)."""
+    global _model_info
+    with _model_info_lock:
+        fetched_at, info = _model_info
+        generation = _model_info_generation
+    if time.monotonic() - fetched_at <= model_info_ttl:
+        return info
+    # Not under the lock: the other sessions' prompts are not held up by this request
+    try:
+        response = client.get("/v1/internal/model/info", timeout=(connect_timeout, info_timeout))
+        response.raise_for_status()
+        info = response.json()
+    except:
+        info = {}
+    with _model_info_lock:
+        # Unless another model was loaded meanwhile
+        if generation == _model_info_generation:
+            _model_info = (time.monotonic(), info)
+    return info
+
+def forget_model_info():
+    """Called after loading another model."""
+    global _model_info, _model_info_generation
+    with _model_info_lock:
+        _model_info = (0.0, {})
+        _model_info_generation += 1
+
+#-------------------------------------------------------------------
+def list_models():
+    """Names of the models the backend can load."""
+    response = client.get("/v1/internal/model/list")
+    response.raise_for_status()
+    data = response.json()
+    # text-generation-webui answers {"model_names": [...]}, OpenAI style servers {"data": [{"id": ...}]}
+    if "model_names" in data:
+        return list(data["model_names"])
+    return [item['id'] for item in data['data']]
+
+def load_model(model_name):
+    """Load another model on the backend; False when it is not one of list_models()."""
+    if model_name not in list_models():
+        return False
+    response = client.post("/v1/internal/model/load", timeout=(connect_timeout, load_timeout), json={"model_name": model_name})
+    response.raise_for_status()
+    forget_model_info()
+    return True
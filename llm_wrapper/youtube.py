@@ -0,0 +1,140 @@
+#----------------------------------------------------------------------------------------------------
+"""YouTube transcripts for the YT page.
+
+Several videos (IDs, URLs or playlist URLs) can be asked for at once. Their
+transcripts are fetched concurrently and kept in memory per video, apart from
+any chunking setting, so moving the chunk sliders only re-chunks them. Chunks
+carry the video and the time range they cover, in their text for the LLM and in
+their metadata for the page.
+"""
+import concurrent.futures
+import os
+import re
+import threading
+
+from llm_wrapper.fetch import fetch_url
+from llm_wrapper.stages import StageCache
+
+#-------------------------------------------------------------------
+languages = ['pt', 'en']
+max_workers = int(os.environ.get("YT_FETCH_WORKERS", "8"))
+playlist_max_videos = int(os.environ.get("YT_PLAYLIST_MAX_VIDEOS", "50"))
+cache_max_entries = int(os.environ.get("TRANSCRIPT_CACHE_ENTRIES", "256"))
+cache_ttl = int(os.environ.get("TRANSCRIPT_CACHE_TTL", "86400"))
+
+video_id = re.compile(r"(?:v=|\/)([0-9A-Za-z_-]{11})")
+bare_video_id = re.compile(r"^[0-9A-Za-z_-]{11}$")
+playlist_id = re.compile(r"[?&]list=([0-9A-Za-z_-]+)")
+playlist_entry = re.compile(r'"playlistVideoRenderer":\{"videoId":"([0-9A-Za-z_-]{11})"')
+
+#-------------------------------------------------------------------
+def playlist_video_ids(playlist):
+    """Video IDs of a public playlist, read from its page."""
+    html = fetch_url("https://www.youtube.com/playlist?list=" + playlist).text
+    return list(dict.fromkeys(playlist_entry.findall(html)))[:playlist_max_videos]
+
+def parse_video_ids(text):
+    """Video IDs from IDs, video URLs and playlist URLs separated by spaces, commas or new lines.
+
+    A URL is read as a playlist when it is a /playlist page or names no video.
+    """
+    ids = []
+    for token in re.split(r"[\s,]+", text):
+        if not token:
+            continue
+        match = video_id.search(token) if "youtu" in token else bare_video_id.match(token)
+        playlist = playlist_id.search(token)
+        # A video opened from a playlist (watch?v=ID&list=...) is that video only
+        if playlist and (match is None or "/playlist" in token):
+            ids.extend(playlist_video_ids(playlist.group(1)))
+            continue
+        if match:
+            ids.append(match.group(1) if match.groups() else match.group(0))
+    return list(dict.fromkeys(ids))
+
+#-------------------------------------------------------------------
+class Transcript:
+    def __init__(self, video_id, entries):
+        self.video_id = video_id
+        # [{"text", "start", "duration"}, ...] as returned by youtube_transcript_api
+        self.entries = entries
+
+    @property
+    def text(self):
+        return "\n".join(entry["text"] for entry in self.entries)
+
+transcripts = StageCache(cache_max_entries, cache_ttl)
+_pool = None
+_pool_lock = threading.Lock()
+
+def _fetch(video_id):
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    transcript = Transcript(video_id, YouTubeTranscriptApi.get_transcript(video_id, languages=languages))
+    transcripts.put(video_id, transcript)
+    return transcript
+
+def fetch_transcripts(video_ids):
+    """Transcripts of the videos, in order: a Transcript or the exception raised for each one."""
+    global _pool
+    results = {}
+    missing = []
+    for video in video_ids:
+        transcript = transcripts.get(video)
+        if transcript is None:
+            missing.append(video)
+        else:
+            results[video] = transcript
+    if missing:
+        with _pool_lock:
+            if _pool is None:
+                _pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="yt-transcript")
+        futures = {video: _pool.submit(_fetch, video) for video in missing}
+        for video, future in futures.items():
+            try:
+                results[video] = future.result()
+            except Exception as e:
+                results[video] = e
+    return [results[video] for video in video_ids]
+
+#-------------------------------------------------------------------
+def timestamp(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return "{}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+    return "{}:{:02d}".format(seconds // 60, seconds % 60)
+
+def _chunk(video, lines):
+    start = lines[0][0]
+    end = lines[-1][0] + lines[-1][1]
+    text = "[video " + video + " " + timestamp(start) + "-" + timestamp(end) + "]\n" + "\n".join(line for _, _, line in lines)
+    metadata = {"video_id": video, "start": start, "end": end, "source": "https://youtu.be/" + video + "?t=" + str(int(start))}
+    return text, metadata
+
+def iter_transcript_chunks(segments, chunk_size, chunk_overlap):
+    """IngestJob chunker: (text, metadata) chunks of whole transcript lines.
+
+    Chunks never span two videos; the last lines of a chunk, up to
+    `chunk_overlap` characters, start the next one.
+    """
+    for transcript in segments:
+        lines = []
+        length = 0
+        for entry in transcript.entries:
+            line = entry["text"].replace("\n", " ").strip()
+            if not line:
+                continue
+            if lines and length + len(line) + 1 > chunk_size:
+                yield _chunk(transcript.video_id, lines)
+                overlap = []
+                length = 0
+                for previous in reversed(lines):
+                    if length + len(previous[2]) + 1 > chunk_overlap:
+                        break
+                    overlap.insert(0, previous)
+                    length += len(previous[2]) + 1
+                lines = overlap
+            lines.append((entry["start"], entry.get("duration", 0), line))
+            length += len(line) + 1
+        if lines:
+            yield _chunk(transcript.video_id, lines)
@@ -0,0 +1,3 @@
+#!/bin/bash
+# The pages and the HTTP API in one process: they share the LLM queue and the vector store
+python -m llm_wrapper.api --pages HomePage.py --server-port 9092
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Nothing written to logs/ or cache/ by the tests
+os.environ["TRACE_PATH"] = ""
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+os.environ["RESPONSE_CACHE_PATH"] = ""
+os.environ["HTTP_CACHE_PATH"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
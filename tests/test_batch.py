@@ -0,0 +1,19 @@
+"""read_questions: pasted lines and CSV files."""
+import pytest
+
+from llm_wrapper.batch import read_questions
+
+
+def test_pasted_lines_then_the_question_column():
+    csv_content = "﻿id,Question\n1,What is IDLE?\n2,\n3,How to set a breakpoint?\n".encode("utf-8")
+    assert read_questions("First?\n\n  Second?  \n", csv_content) == [
+        "First?", "Second?", "What is IDLE?", "How to set a breakpoint?"]
+
+
+def test_first_column_without_a_question_header():
+    assert read_questions("", b"What is IDLE?,x\nWhy?\n") == ["What is IDLE?", "Why?"]
+
+
+def test_csv_not_in_utf8_is_a_value_error():
+    with pytest.raises(ValueError, match="not UTF-8"):
+        read_questions("", "question\nQu'est-ce qu'un éditeur ?\n".encode("latin-1"))
@@ -0,0 +1,34 @@
+"""pack_documents: room for the answer, and the prompt's token count."""
+from types import SimpleNamespace
+
+from langchain_core.documents import Document
+from langchain_core.prompts import PromptTemplate
+
+from llm_wrapper import budget
+from llm_wrapper.budget import pack_documents
+
+
+def stuff_chain(max_tokens):
+    prompt = PromptTemplate.from_template("Context:\n{context}\nQuestion: {question}\nAnswer:")
+    llm = SimpleNamespace(max_tokens=max_tokens)
+    return SimpleNamespace(llm_chain=SimpleNamespace(llm=llm, prompt=prompt), document_variable_name="context",
+                           document_separator="\n\n--------\n\n")
+
+
+def documents(count, words):
+    return [Document(page_content=" ".join("chunk" + str(i) + "word" + str(j) for j in range(words))) for i in range(count)]
+
+
+def test_max_tokens_as_large_as_the_window_leaves_room_for_the_chunks(monkeypatch):
+    monkeypatch.setattr(budget, "context_tokens", 2048)
+    packed = pack_documents(stuff_chain(2048), documents(3, 20), "question?")
+    assert len(packed.documents) == 3
+    assert packed.dropped == 0
+
+
+def test_truncated_chunk_counts_the_separator_once(monkeypatch):
+    monkeypatch.setattr(budget, "context_tokens", 2048)
+    packed = pack_documents(stuff_chain(256), documents(10, 200), "question?")
+    assert packed.truncated == 1
+    # The prompt fills the budget exactly: each separator counted once
+    assert packed.prompt_tokens == int((2048 - 256) * budget.safety_margin)
@@ -0,0 +1,53 @@
+"""fetch_urls: the HTTP cache is used, off the shared event loop."""
+import http.server
+import threading
+
+import pytest
+
+from llm_wrapper import fetch
+from llm_wrapper.fetch import HttpCache, fetch_url
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b"<html><body>page</body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=60")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingCache(HttpCache):
+    """HttpCache recording the threads it is called from."""
+
+    threads = set()
+
+    def get(self, url):
+        self.threads.add(threading.current_thread().name)
+        return super().get(url)
+
+    def put(self, *args):
+        self.threads.add(threading.current_thread().name)
+        return super().put(*args)
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:" + str(server.server_address[1]) + "/"
+    server.shutdown()
+
+
+def test_cache_is_read_and_written_off_the_event_loop(server, tmp_path, monkeypatch):
+    cache = RecordingCache(str(tmp_path / "http.sqlite"))
+    monkeypatch.setattr(fetch, "_cache", cache)
+    assert not fetch_url(server).from_cache
+    page = fetch_url(server)
+    assert page.from_cache and page.text == "<html><body>page</body></html>"
+    assert cache.threads and "llm-wrapper-fetch" not in cache.threads
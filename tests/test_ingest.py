@@ -0,0 +1,22 @@
+"""iter_chunks: the text is chunked as it streams in without changing it."""
+from llm_wrapper.ingest import iter_chunks
+
+words = ["word" + str(number) for number in range(400)]
+# Lines ending in a space, as PDF pages and transcripts often do
+text = "".join(" ".join(words[i:i + 8]) + " \n" for i in range(0, len(words), 8))
+
+
+def test_segments_cut_anywhere_keep_the_words():
+    for size in (5, 13, 64, 200):
+        segments = [text[i:i + size] for i in range(0, len(text), size)]
+        chunks = list(iter_chunks(segments, 100, 20))
+        assert {word for chunk in chunks for word in chunk.split()} == set(words)
+
+
+def test_segment_ending_in_a_space_is_not_glued_to_the_next():
+    filler = "".join("line " + str(number) + "\n" for number in range(60))
+    segments = [filler + "under the ", "Highlights tab\n" + filler + "five ", "actions\n"]
+    chunks = list(iter_chunks(segments, 100, 20))
+    joined = " ".join(chunks)
+    assert "theHighlights" not in joined and "fiveactions" not in joined
+    assert "five actions" in joined
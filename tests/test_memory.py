@@ -0,0 +1,72 @@
+"""DeferredSummaryMemory: turns leave the history only once they are summarised."""
+from typing import Any, List, Optional
+
+from langchain_core.language_models.llms import LLM
+
+from llm_wrapper import memory
+from llm_wrapper.memory import DeferredSummaryMemory
+
+
+class FlakyLLM(LLM):
+    """Summarises by listing the turns of the prompt, failing the first `failures` calls."""
+
+    failures: int = 0
+    prompts: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "flaky"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        self.prompts.append(prompt)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("backend down")
+        return "summary of: " + ", ".join(sorted(set(word for word in prompt.split() if word.startswith("turn"))))
+
+
+def wait_for_summaries():
+    # The worker runs one task at a time, in order
+    memory._worker.submit(lambda: None).result()
+
+
+def save_turn(conversation, number):
+    conversation.save_context({"input": "question turn" + str(number) + " " + "x " * 40},
+                              {"response": "answer turn" + str(number) + " " + "y " * 40})
+    wait_for_summaries()
+
+
+def history(conversation):
+    return conversation.load_memory_variables({})["history"]
+
+
+def test_failed_summary_is_retried_with_the_next_one():
+    llm = FlakyLLM(failures=1)
+    conversation = DeferredSummaryMemory(llm=llm, max_token_limit=30)
+
+    save_turn(conversation, 0)
+    save_turn(conversation, 1)
+    # The summary of turn 0 failed: it stays verbatim, nothing is lost
+    assert len(llm.prompts) == 1
+    assert conversation.moving_summary_buffer == ""
+    assert "turn0" in history(conversation)
+
+    save_turn(conversation, 2)
+    # The next summary covers turn 0 and turn 1
+    assert "turn0" in llm.prompts[-1] and "turn1" in llm.prompts[-1]
+    assert conversation.pending_messages == []
+    text = history(conversation)
+    assert text.count("turn0") == 1 and text.count("turn1") == 1
+    assert "question turn2" in text and "answer turn2" in text
+
+
+def test_turns_stay_in_history_while_pending():
+    llm = FlakyLLM(failures=2)
+    conversation = DeferredSummaryMemory(llm=llm, max_token_limit=30)
+    for number in range(3):
+        save_turn(conversation, number)
+    text = history(conversation)
+    assert all(text.count("question turn" + str(number)) == 1 for number in range(3))
+
+    conversation.clear()
+    assert history(conversation) == ""
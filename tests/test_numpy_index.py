@@ -0,0 +1,53 @@
+"""NumpyKnowledgeBase: the same top k as a brute-force cosine search."""
+import numpy as np
+
+from llm_wrapper.numpy_index import NumpyKnowledgeBase
+
+
+def brute_force(vectors, query, k):
+    vectors = np.asarray(vectors, dtype=np.float64)
+    query = np.asarray(query, dtype=np.float64)
+    scores = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    order = np.argsort(-scores, kind="stable")[:k]
+    return ["chunk " + str(index) for index in order], scores[order]
+
+
+def check(knowledge_base, vectors, queries, k):
+    for query, results in zip(queries, knowledge_base.similarity_search_batch_with_score_by_vectors(queries, k=k)):
+        texts, scores = brute_force(vectors, query, k)
+        assert [doc.page_content for doc, _ in results] == texts
+        assert np.allclose([score for _, score in results], scores, atol=1e-5)
+
+
+def test_top_k_in_order_against_brute_force():
+    generator = np.random.default_rng(0)
+    vectors = generator.standard_normal((300, 32)).tolist()
+    queries = generator.standard_normal((20, 32)).tolist()
+    knowledge_base = NumpyKnowledgeBase(None, 32)
+    knowledge_base.add(["chunk " + str(i) for i in range(300)], vectors, [{"row": i} for i in range(300)])
+    check(knowledge_base, vectors, queries, 6)
+    doc, score = knowledge_base.similarity_search_with_score_by_vector(queries[0], k=1)[0]
+    assert doc.metadata == {"row": int(doc.page_content.split()[1])}
+
+
+def test_k_larger_than_the_chunks_and_empty_index():
+    knowledge_base = NumpyKnowledgeBase(None, 4)
+    assert knowledge_base.similarity_search_with_score_by_vector([1, 0, 0, 0], k=4) == []
+    vectors = [[1, 0, 0, 0], [0, 1, 0, 0], [1, 1, 0, 0]]
+    knowledge_base.add(["chunk 0", "chunk 1", "chunk 2"], vectors)
+    check(knowledge_base, vectors, [[1, 0.2, 0, 0]], 10)
+    assert len(knowledge_base.similarity_search_with_score_by_vector([1, 0, 0, 0], k=10)) == 3
+
+
+def test_chunks_added_after_a_search_are_found():
+    generator = np.random.default_rng(1)
+    vectors = generator.standard_normal((200, 16)).tolist()
+    queries = generator.standard_normal((10, 16)).tolist()
+    knowledge_base = NumpyKnowledgeBase(None, 16)
+    knowledge_base.add(["chunk " + str(i) for i in range(50)], vectors[:50])
+    check(knowledge_base, vectors[:50], queries, 5)
+    # The matrix grows twice (to 100, then 200 rows) between the searches
+    for start in range(50, 200, 30):
+        knowledge_base.add(["chunk " + str(i) for i in range(start, min(start + 30, 200))], vectors[start:start + 30])
+        check(knowledge_base, vectors[:min(start + 30, 200)], queries, 5)
+    assert len(knowledge_base) == 200
@@ -0,0 +1,44 @@
+"""prompting_llm reports backend errors, but lets Streamlit stop or rerun the script."""
+import pytest
+from streamlit.runtime.scriptrunner import RerunException, StopException
+
+from llm_wrapper import chat
+
+
+class StreamingLLM:
+    def __init__(self, error):
+        self.error = error
+
+    def stream(self, prompt):
+        yield "Hello"
+        raise self.error
+
+
+class ConversationChain:
+    def __init__(self, error):
+        self.llm = StreamingLLM(error)
+
+    def prep_inputs(self, inputs):
+        return inputs
+
+    @property
+    def prompt(self):
+        return self
+
+    def format(self, **inputs):
+        return inputs["input"]
+
+
+@pytest.fixture(autouse=True)
+def remote_ip(monkeypatch):
+    monkeypatch.setattr(chat, "get_remote_ip", lambda: "127.0.0.1")
+
+
+@pytest.mark.parametrize("error", [StopException(), RerunException(None)])
+def test_streamlit_control_exceptions_propagate(error):
+    with pytest.raises(type(error)):
+        chat.prompting_llm("hi", ConversationChain(error), "local", stream=True)
+
+
+def test_backend_errors_are_reported():
+    assert chat.prompting_llm("hi", ConversationChain(ConnectionError()), "local", stream=True) == "No response from LLM"
@@ -0,0 +1,63 @@
+"""ResponseCache: exact and semantic tiers, and when the question is embedded."""
+import numpy as np
+import pytest
+
+from llm_wrapper.response_cache import ResponseCache
+
+
+class Key:
+    """Stand-in for ResponseKey, recording when its embedding is asked for."""
+
+    def __init__(self, key, vector, scope="scope", cache=None):
+        self.key = key
+        self.scope = scope
+        self._vector = np.asarray(vector, dtype=np.float32) / np.linalg.norm(vector)
+        self.cache = cache
+        self.embedded = False
+
+    @property
+    def vector(self):
+        # Embedding may load the model: the cache must not hold its lock meanwhile
+        assert self.cache is None or not self.cache._lock.locked()
+        self.embedded = True
+        return self._vector
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "responses.sqlite"), threshold=0.9)
+
+
+def test_exact_hit_does_not_embed(cache):
+    cache.put(Key("a", [1, 0]), "answer")
+    key = Key("a", [1, 0], cache=cache)
+    assert cache.get(key) == ("answer", "exact")
+    assert not key.embedded
+
+
+def test_semantic_hit_embeds_outside_the_lock(cache):
+    cache.put(Key("a", [1, 0]), "answer")
+    key = Key("b", [1, 0.1], cache=cache)
+    assert cache.get(key) == ("answer", "semantic")
+    assert key.embedded
+    assert cache.get(Key("c", [0, 1], cache=cache)) is None
+    assert cache.get(Key("d", [1, 0], scope="other", cache=cache)) is None
+
+
+def test_semantic_tier_off_never_embeds(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), threshold=0)
+    cache.put(Key("a", [1, 0]), "answer")
+    key = Key("b", [1, 0], cache=cache)
+    assert cache.get(key) is None
+    assert not key.embedded
+
+
+def test_expired_entries_are_found_through_an_index(cache):
+    plan = cache._connection.execute("EXPLAIN QUERY PLAN DELETE FROM responses WHERE created < ?", (0,)).fetchall()
+    assert any("responses_created" in row[-1] for row in plan)
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl=-1, threshold=0)
+    cache.put(Key("a", [1, 0]), "answer")
+    assert cache.get(Key("a", [1, 0])) is None
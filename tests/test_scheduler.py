@@ -0,0 +1,100 @@
+"""Scheduler: bounded queue, round-robin between users, slots always given back."""
+import threading
+
+import pytest
+from streamlit.runtime.scriptrunner import StopException
+
+from llm_wrapper.scheduler import Scheduler, SchedulerBusy
+
+
+def test_full_queue_is_busy():
+    scheduler = Scheduler(concurrency=1, max_waiting=2, max_waiting_per_user=2)
+    running = scheduler.submit("a")
+    assert running.granted
+    scheduler.submit("b")
+    scheduler.submit("c")
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit("d")
+    scheduler.release(running)
+    # The slot went to the next one, which frees a place in the queue
+    scheduler.submit("d")
+
+
+def test_one_user_cannot_fill_the_queue():
+    scheduler = Scheduler(concurrency=1, max_waiting=16, max_waiting_per_user=2)
+    scheduler.submit("a")
+    scheduler.submit("a")
+    scheduler.submit("a")
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit("a")
+    assert not scheduler.submit("b").granted
+
+
+def test_round_robin_between_users():
+    scheduler = Scheduler(concurrency=1, max_waiting=16, max_waiting_per_user=4)
+    running = scheduler.submit("a")
+    a2 = scheduler.submit("a")
+    a3 = scheduler.submit("a")
+    b1 = scheduler.submit("b")
+    assert [scheduler.position(t) for t in (a2, b1, a3)] == [1, 2, 3]
+
+    order = []
+    for _ in range(3):
+        scheduler.release(running)
+        running = next(t for t in (a2, a3, b1) if t.granted)
+        order.append(running)
+    assert order == [a2, b1, a3]
+
+
+def test_leaving_the_queue():
+    scheduler = Scheduler(concurrency=1, max_waiting=16, max_waiting_per_user=2)
+    running = scheduler.submit("a")
+    waiting = scheduler.submit("b")
+    scheduler.release(waiting)
+    assert scheduler.waiting == 0
+    scheduler.release(running)
+    assert scheduler.running == 0
+
+
+def test_slot_is_given_back_when_the_block_fails():
+    scheduler = Scheduler(concurrency=1)
+    with pytest.raises(RuntimeError):
+        with scheduler.slot("a"):
+            raise RuntimeError("backend down")
+    assert scheduler.running == 0
+
+
+def test_stopping_the_page_while_queued_leaves_the_queue():
+    scheduler = Scheduler(concurrency=1)
+    running = scheduler.submit("a")
+    positions = []
+
+    def on_wait(position):
+        # What placeholder_feedback does when the user leaves the page
+        positions.append(position)
+        raise StopException()
+
+    with pytest.raises(StopException):
+        with scheduler.slot("b", on_wait):
+            pass
+    assert positions == [1]
+    assert scheduler.waiting == 0
+    scheduler.release(running)
+    assert scheduler.running == 0
+
+
+def test_waiting_slot_is_granted_on_release():
+    scheduler = Scheduler(concurrency=1)
+    running = scheduler.submit("a")
+    granted = threading.Event()
+
+    def wait_for_slot():
+        with scheduler.slot("b"):
+            granted.set()
+
+    thread = threading.Thread(target=wait_for_slot)
+    thread.start()
+    assert not granted.wait(0.2)
+    scheduler.release(running)
+    thread.join(5)
+    assert granted.is_set() and scheduler.running == 0
@@ -0,0 +1,48 @@
+"""Stage caches: bounded by entries and by the length of the text they hold."""
+from llm_wrapper import stages
+from llm_wrapper.stages import StageCache, cached_chunker, cached_segments
+
+
+def test_least_recently_used_entries_leave_beyond_the_size():
+    cache = StageCache(10, ttl=60, max_size=10)
+    cache.put("a", "aaaa", 4)
+    cache.put("b", "bbbb", 4)
+    cache.get("a")
+    cache.put("c", "cccc", 4)
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+    # Replacing an entry does not count it twice
+    cache.put("c", "cc", 2)
+    cache.put("d", "dddd", 4)
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cc" and cache.get("d") == "dddd"
+
+
+def test_value_larger_than_the_cache_is_not_kept():
+    cache = StageCache(10, ttl=60, max_size=10)
+    cache.put("a", "aaaa", 4)
+    cache.put("big", "b" * 11, 11)
+    assert cache.get("big") is None and cache.get("a") == "aaaa"
+
+
+def test_large_document_is_streamed_without_being_collected(monkeypatch):
+    monkeypatch.setattr(stages, "documents", StageCache(10, ttl=60, max_size=100))
+    pages = ["page " + str(number) + " " + "x" * 30 for number in range(10)]
+    assert list(cached_segments("large", lambda: iter(pages))) == pages
+    assert stages.documents.get("large") is None
+    assert list(cached_segments("small", lambda: iter(pages[:2]))) == pages[:2]
+    assert stages.documents.get("small") == pages[:2]
+
+
+def test_chunks_are_reused_for_the_same_parameters(monkeypatch):
+    monkeypatch.setattr(stages, "chunk_lists", StageCache(10, ttl=60, max_size=1000))
+    calls = []
+
+    def chunker(segments, chunk_size, chunk_overlap):
+        calls.append(chunk_size)
+        return ((segment, {"size": chunk_size}) for segment in segments)
+
+    chunk = cached_chunker("source", chunker)
+    first = list(chunk(iter(["one", "two"]), 100, 10))
+    assert list(chunk(iter([]), 100, 10)) == first
+    list(chunk(iter(["one", "two"]), 200, 10))
+    assert calls == [100, 200]
@@ -0,0 +1,67 @@
+"""model_info: remembered for a few seconds, fetched without holding the other sessions."""
+import threading
+
+import pytest
+
+from llm_wrapper import webui
+from llm_wrapper.backend import info_timeout
+
+
+class Response:
+    def __init__(self, info):
+        self.info = info
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.info
+
+
+class SlowClient:
+    """Answers the model info once `release` is set, recording the timeouts asked for."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.timeouts = []
+        self.model_name = "first"
+
+    def get(self, path, timeout=None):
+        self.timeouts.append(timeout)
+        name = self.model_name
+        self.started.set()
+        self.release.wait(5)
+        return Response({"model_name": name})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = SlowClient()
+    monkeypatch.setattr(webui, "client", client)
+    webui.forget_model_info()
+    yield client
+    client.release.set()
+    webui.forget_model_info()
+
+
+def test_info_is_remembered_and_asked_with_a_short_timeout(client):
+    client.release.set()
+    assert webui.model_info() == {"model_name": "first"}
+    assert webui.model_info() == {"model_name": "first"}
+    assert len(client.timeouts) == 1 and client.timeouts[0][1] == info_timeout
+
+
+def test_slow_backend_does_not_hold_the_lock(client):
+    thread = threading.Thread(target=webui.model_info)
+    thread.start()
+    assert client.started.wait(5)
+    # Loading a model does not wait for the request in flight, whose answer is then dropped
+    forgotten = threading.Thread(target=webui.forget_model_info)
+    forgotten.start()
+    forgotten.join(1)
+    assert not forgotten.is_alive()
+    client.model_name = "second"
+    client.release.set()
+    thread.join(5)
+    assert webui.model_info() == {"model_name": "second"}
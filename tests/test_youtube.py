@@ -0,0 +1,107 @@
+"""Video IDs from the YT page input, transcript fetching and chunking."""
+import sys
+import types
+
+import pytest
+
+from llm_wrapper import youtube
+from llm_wrapper.stages import StageCache
+from llm_wrapper.youtube import Transcript, fetch_transcripts, iter_transcript_chunks, parse_video_ids
+
+video_a = "dQw4w9WgXcQ"
+video_b = "9bZkp7q19f0"
+
+
+@pytest.fixture
+def playlists(monkeypatch):
+    requested = []
+
+    def playlist_video_ids(playlist):
+        requested.append(playlist)
+        return [video_a, video_b]
+
+    monkeypatch.setattr(youtube, "playlist_video_ids", playlist_video_ids)
+    return requested
+
+
+def test_ids_and_video_urls(playlists):
+    text = video_a + ", https://www.youtube.com/watch?v=" + video_b + "\nhttps://youtu.be/" + video_a + "?t=42 not-an-id"
+    assert parse_video_ids(text) == [video_a, video_b]
+    assert playlists == []
+
+
+def test_video_opened_from_a_playlist_is_that_video_only(playlists):
+    assert parse_video_ids("https://www.youtube.com/watch?v=" + video_b + "&list=PLabc&index=3") == [video_b]
+    assert parse_video_ids("https://youtu.be/" + video_b + "?list=PLabc") == [video_b]
+    assert playlists == []
+
+
+def test_playlist_urls(playlists):
+    assert parse_video_ids("https://www.youtube.com/playlist?list=PLabc " + video_b) == [video_a, video_b]
+    assert playlists == ["PLabc"]
+
+
+def test_playlist_page_entries(monkeypatch):
+    html = "".join('"playlistVideoRenderer":{"videoId":"' + video + '"' for video in (video_a, video_b, video_a))
+    monkeypatch.setattr(youtube, "fetch_url", lambda url: types.SimpleNamespace(text=html))
+    assert youtube.playlist_video_ids("PLabc") == [video_a, video_b]
+
+
+def transcript(video, lines, duration=2.0):
+    return Transcript(video, [{"text": line, "start": 60.0 * index, "duration": duration} for index, line in enumerate(lines)])
+
+
+def test_chunks_of_whole_lines_with_overlap_and_timestamps():
+    lines = ["line " + str(number) + "\nwrapped" for number in range(10)]
+    chunks = list(iter_transcript_chunks([transcript(video_a, lines)], 60, 20))
+    texts = [text.split("\n", 1)[1] for text, _ in chunks]
+    assert texts[0].split("\n")[0] == "line 0 wrapped"
+    # Every line is kept whole, and the last line of a chunk starts the next one
+    for previous, current in zip(texts, texts[1:]):
+        assert current.split("\n")[0] == previous.split("\n")[-1]
+    assert {line for text in texts for line in text.split("\n")} == {line.replace("\n", " ") for line in lines}
+    text, metadata = chunks[0]
+    assert text.startswith("[video " + video_a + " 0:00-")
+    assert metadata["video_id"] == video_a and metadata["start"] == 0.0
+    assert metadata["source"] == "https://youtu.be/" + video_a + "?t=0"
+    assert chunks[-1][1]["end"] == 60.0 * 9 + 2.0
+
+
+def test_hour_long_timestamps():
+    text, metadata = next(iter_transcript_chunks([transcript(video_a, ["a"] * 62)], 10000, 0))
+    assert text.startswith("[video " + video_a + " 0:00-1:01:02]")
+
+
+def test_chunks_never_span_two_videos():
+    segments = [transcript(video_a, ["first video"] * 3), transcript(video_b, ["second video"] * 3)]
+    chunks = list(iter_transcript_chunks(segments, 1000, 200))
+    assert [metadata["video_id"] for _, metadata in chunks] == [video_a, video_b]
+    assert "second" not in chunks[0][0] and "first" not in chunks[1][0]
+
+
+@pytest.fixture
+def transcript_api(monkeypatch):
+    """Stub of youtube_transcript_api, recording the videos asked for."""
+    requested = []
+
+    class YouTubeTranscriptApi:
+        @staticmethod
+        def get_transcript(video_id, languages=()):
+            requested.append(video_id)
+            if video_id == video_b:
+                raise RuntimeError("Transcripts are disabled")
+            return [{"text": "hello", "start": 0.0, "duration": 1.0}]
+
+    monkeypatch.setitem(sys.modules, "youtube_transcript_api", types.SimpleNamespace(YouTubeTranscriptApi=YouTubeTranscriptApi))
+    monkeypatch.setattr(youtube, "transcripts", StageCache(16, 60))
+    return requested
+
+
+def test_fetch_transcripts_in_order_with_errors_and_cached(transcript_api):
+    first, second = fetch_transcripts([video_a, video_b])
+    assert isinstance(first, Transcript) and first.text == "hello"
+    assert isinstance(second, RuntimeError)
+    assert fetch_transcripts([video_a])[0] is first
+    # Failures are not cached, the video is asked for again
+    fetch_transcripts([video_b])
+    assert sorted(transcript_api) == sorted([video_a, video_b, video_b])